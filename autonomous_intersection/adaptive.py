@@ -0,0 +1,263 @@
+import argparse
+import csv
+import math
+import os
+import statistics
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, asdict, fields, replace
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from autonomous_intersection.constants import STEPS_PER_SECOND
+from autonomous_intersection.model import Intersection, Manager
+from autonomous_intersection.sweep import RunConfig, grid
+
+
+@dataclass
+class Replication:
+    seed: int
+    steps: int
+    measured_steps: int
+    steady: bool
+    cars: int
+    throughput: float
+    delay: float
+
+
+@dataclass
+class Estimate:
+    manager: str
+    spawn_rate: int
+    velocity: int
+    acceleration: int
+    width: int
+    height: int
+    replications: int
+    simulated_steps: int
+    converged: bool
+    throughput: float
+    throughput_half_width: float
+    delay: float
+    delay_half_width: float
+
+
+def t_quantile(probability: float, degrees: int) -> float:
+    """
+    :return: quantile of the Student t distribution, Cornish-Fisher expansion around the normal quantile,
+    accurate to about 0.01 for three and more degrees of freedom
+    """
+    z = statistics.NormalDist().inv_cdf(probability)
+    terms = ((z ** 3 + z) / 4,
+             (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96,
+             (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384,
+             (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / 92160)
+    return z + sum(term / degrees ** power for power, term in enumerate(terms, 1))
+
+
+def confidence_interval(values: Sequence[float], confidence: float = 0.95) -> Tuple[float, float]:
+    """
+    :return: mean and half width of the confidence interval, infinite half width for fewer than two values
+    """
+    mean = statistics.fmean(values)
+    if len(values) < 2:
+        return mean, math.inf
+    return mean, t_quantile((1 + confidence) / 2, len(values) - 1) * statistics.stdev(values) / math.sqrt(len(values))
+
+
+def is_steady(windows: List[Tuple[int, float]], patience: int, tolerance: float) -> bool:
+    """
+    :param windows: number of departed cars and their summed delay in every window, the first one is the warm-up
+    :return: True if the throughput and mean delay of the last patience windows differ from those of the patience
+    windows before by at most the relative tolerance
+    """
+    if len(windows) < 2 * patience + 1:
+        return False
+    recent, previous = windows[-patience:], windows[-2 * patience:-patience]
+    for metric in (_rate, _delay):
+        a, b = metric(recent), metric(previous)
+        if abs(a - b) > tolerance * max(abs(a), abs(b)):
+            return False
+    return True
+
+
+def _rate(windows: List[Tuple[int, float]]) -> float:
+    return sum(cars for cars, _ in windows) / len(windows)
+
+
+def _delay(windows: List[Tuple[int, float]]) -> float:
+    cars = sum(cars for cars, _ in windows)
+    return sum(delay for _, delay in windows) / cars if cars else 0.0
+
+
+def replicate(config: RunConfig, window: int = 500, patience: int = 3, tolerance: float = 0.05) -> Replication:
+    """
+    Runs the model for at most config.steps steps, the run stops early once it is steady (see is_steady).
+    Throughput in cars per minute and mean delay in seconds of departed cars are measured over the last
+    2 * patience windows of a steady run, over the second half of the windows otherwise.
+    """
+    model = Intersection(config.height, config.width, config.spawn_rate, config.manager,
+                         velocity=config.velocity, acceleration=config.acceleration, seed=config.seed,
+                         fast_forward=config.fast_forward, track_cars=True, headless=True)
+    windows: List[Tuple[int, float]] = []
+    cars, delay = 0, 0.0
+    steady = False
+    step = 0
+    while step < config.steps:
+        # jumps end at window boundaries, cars only leave in regular steps
+        step += model.advance(min(config.steps, (step // window + 1) * window) - step)
+        cars += len(model.departures)
+        delay += sum(car.lost_time for car in model.departures)
+        if step % window == 0:
+            windows.append((cars, delay))
+            cars, delay = 0, 0.0
+            steady = is_steady(windows, patience, tolerance)
+            if steady:
+                break
+    model.close()
+    measured = windows[-2 * patience:] if steady else windows[len(windows) // 2:]
+    measured_steps = len(measured) * window
+    if not measured:
+        # shorter than a window
+        measured, measured_steps = [(cars, delay)], model.schedule.steps
+    departed = sum(count for count, _ in measured)
+    return Replication(config.seed, model.schedule.steps, measured_steps, steady, departed,
+                       departed / max(measured_steps, 1) * STEPS_PER_SECOND * 60, _delay(measured) / STEPS_PER_SECOND)
+
+
+def _replicate(arguments: Tuple[RunConfig, int, int, float]) -> Replication:
+    return replicate(*arguments)
+
+
+class Stopping:
+    """
+    Sequential stopping rule of one configuration. Replications are evaluated in seed order, so the estimate
+    does not depend on the order in which parallel runs finish. The configuration is done with the first
+    number of replications for which the confidence intervals of both throughput and delay are narrow enough,
+    or with max_replications.
+    """
+
+    def __init__(self, config: RunConfig, min_replications: int, max_replications: int, relative_width: float,
+                 throughput_width: float, delay_width: float, confidence: float):
+        self.config = config
+        self.min_replications = max(2, min_replications)
+        self.max_replications = max(self.min_replications, max_replications)
+        self.relative_width = relative_width
+        self.widths = (throughput_width, delay_width)
+        self.confidence = confidence
+        self.results: Dict[int, Replication] = {}
+        self.used: List[Replication] = []
+        self.launched = 0
+        self.done = False
+
+    def next_config(self) -> RunConfig:
+        config = replace(self.config, seed=self.config.seed + self.launched)
+        self.launched += 1
+        return config
+
+    def add(self, index: int, replication: Replication) -> None:
+        self.results[index] = replication
+        while not self.done and len(self.used) in self.results:
+            self.used.append(self.results[len(self.used)])
+            self.done = self.is_precise() or len(self.used) >= self.max_replications
+
+    def intervals(self) -> List[Tuple[float, float]]:
+        return [confidence_interval([replication.throughput for replication in self.used], self.confidence),
+                confidence_interval([replication.delay for replication in self.used], self.confidence)]
+
+    def is_precise(self) -> bool:
+        if len(self.used) < self.min_replications:
+            return False
+        return all(2 * half_width <= max(self.relative_width * abs(mean), width)
+                   for (mean, half_width), width in zip(self.intervals(), self.widths))
+
+    def estimate(self) -> Estimate:
+        (throughput, throughput_half_width), (delay, delay_half_width) = self.intervals()
+        config = self.config
+        return Estimate(config.manager, config.spawn_rate, config.velocity, config.acceleration, config.width,
+                        config.height, len(self.used), sum(replication.steps for replication in self.used),
+                        self.is_precise(), throughput, throughput_half_width, delay, delay_half_width)
+
+
+def adaptive_sweep(configs: Sequence[RunConfig], min_replications: int = 4, max_replications: int = 50,
+                   relative_width: float = 0.1, throughput_width: float = 2.0, delay_width: float = 0.5,
+                   confidence: float = 0.95, window: int = 500, patience: int = 3, tolerance: float = 0.05,
+                   processes: Optional[int] = None) -> Iterator[Estimate]:
+    """
+    Replicates every configuration with seeds config.seed, config.seed + 1, ... until the full widths of the
+    confidence intervals of throughput (cars per minute) and delay (seconds) are at most relative_width of the
+    mean or the absolute throughput_width and delay_width. The pool is kept busy with replications
+    of the configurations that are not done yet, the one with the fewest launched replications first.
+    :return: estimates in configuration order
+    """
+    rules = [Stopping(config, min_replications, max_replications, relative_width, throughput_width, delay_width,
+                      confidence) for config in configs]
+    capacity = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=capacity) as executor:
+        pending: Dict[Future, Tuple[Stopping, int]] = {}
+        while True:
+            waiting = [rule for rule in rules if not rule.done and rule.launched < rule.max_replications]
+            while waiting and len(pending) < capacity:
+                rule = min(waiting, key=lambda candidate: candidate.launched)
+                index = rule.launched
+                future = executor.submit(_replicate, (rule.next_config(), window, patience, tolerance))
+                pending[future] = (rule, index)
+                waiting = [candidate for candidate in waiting if candidate.launched < candidate.max_replications]
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                rule, index = pending.pop(future)
+                rule.add(index, future.result())
+            for future, (rule, _) in list(pending.items()):
+                if rule.done and future.cancel():
+                    del pending[future]
+    yield from (rule.estimate() for rule in rules)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replications of every configuration until the confidence "
+                                                 "intervals of throughput and delay are narrow enough")
+    parser.add_argument("--managers", nargs="+", default=[manager.name for manager in Manager],
+                        choices=[manager.name for manager in Manager])
+    parser.add_argument("--spawn-rates", nargs="+", type=int, default=[10])
+    parser.add_argument("--velocities", nargs="+", type=int, default=[40])
+    parser.add_argument("--accelerations", nargs="+", type=int, default=[30])
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first replication")
+    parser.add_argument("--max-steps", type=int, default=20000, help="length of runs that do not get steady")
+    parser.add_argument("--width", type=int, default=1000)
+    parser.add_argument("--height", type=int, default=1000)
+    parser.add_argument("--fast-forward", action="store_true")
+    parser.add_argument("--min-replications", type=int, default=4)
+    parser.add_argument("--max-replications", type=int, default=50)
+    parser.add_argument("--relative-width", type=float, default=0.1)
+    parser.add_argument("--throughput-width", type=float, default=2.0, help="cars per minute")
+    parser.add_argument("--delay-width", type=float, default=0.5, help="seconds")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--window", type=int, default=500, help="steps of a steady state detection window")
+    parser.add_argument("--patience", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--output", default="adaptive.csv")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configs = grid(args.managers, args.spawn_rates, args.velocities, args.accelerations, [args.seed],
+                   args.max_steps, args.width, args.height, args.fast_forward)
+    start = time.perf_counter()
+    with open(args.output, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=[field.name for field in fields(Estimate)])
+        writer.writeheader()
+        replications = 0
+        for estimate in adaptive_sweep(configs, args.min_replications, args.max_replications, args.relative_width,
+                                       args.throughput_width, args.delay_width, args.confidence, args.window,
+                                       args.patience, args.tolerance, args.processes):
+            writer.writerow(asdict(estimate))
+            replications += estimate.replications
+    print(F"{len(configs)} configurations, {replications} replications written to {args.output} "
+          F"in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
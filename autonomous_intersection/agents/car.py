@@ -1,14 +1,18 @@
 import math
 from dataclasses import dataclass, replace
 from math import cos, sin
-from typing import Tuple
+from typing import TYPE_CHECKING, List, Tuple, Optional
 
 from mesa import Agent
 
+import autonomous_intersection.trajectory_library
 from autonomous_intersection.agents.direction import Direction, Steer
 from autonomous_intersection.line import Line, Axis
 from autonomous_intersection.rect import Rect
 
+if TYPE_CHECKING:
+    import autonomous_intersection.agents.fleet
+
 
 class Car(Agent):
     @dataclass
@@ -27,9 +31,17 @@ class Car(Agent):
 
         def copy(self): return replace(self)
 
+        def key(self, ignore_target_velocity: bool = False) -> tuple:
+            target_velocity = None if ignore_target_velocity else self.target_velocity
+            return (self.x, self.y, self.rotation, self.velocity, self.direction, self.rotation_speed, self.steer,
+                    self.target_angle, self.needs_turn, target_velocity, self.delay)
+
     def __init__(self, _id, model, start_line: Line, target_line: Line, position, size,
                  initial_direction: Direction = Direction.Left, target: Direction = Direction.Right, color=None,
-                 velocity: int = 10, acceleration: int = 2, deceleration: int = 7):
+                 velocity: int = 10, acceleration: int = 2, deceleration: int = 7,
+                 trajectories: Optional["autonomous_intersection.trajectory_library.TrajectoryLibrary"] = None,
+                 closed_form_turns: bool = False,
+                 fleet: Optional["autonomous_intersection.agents.fleet.CarFleet"] = None):
         super().__init__(_id, model)
         self.width, self.height = size
         self.color = color if color is not None else self.random_color()
@@ -40,7 +52,7 @@ class Car(Agent):
         self.start_line: Line = start_line
         self.target_line = target_line
         direction, rotation = self.rotate_by_right_angle(0.0, initial_direction.angle, Direction.Right.velocity)
-        self.state = Car.State(
+        state = Car.State(
             *position,
             rotation=rotation,
             velocity=velocity,
@@ -57,6 +69,29 @@ class Car(Agent):
         self.max_velocity = velocity
         self.initial_direction: Direction = initial_direction
         self.target: Direction = target
+        self.trajectories = trajectories
+        self.closed_form_turns = closed_form_turns
+        self.fleet = fleet
+        self._state = fleet.add(self, state) if fleet is not None else state
+
+        self.route: List[Direction] = []
+        """Targets at the following intersections of a network"""
+        self.spawn_step = 0
+        self.entry_step: Optional[int] = None
+        self.lost_time = 0.0
+        self.stopped_steps = 0
+        self.stop_decisions = 0
+
+    @property
+    def state(self) -> "Car.State":
+        return self._state
+
+    @state.setter
+    def state(self, state: "Car.State"):
+        if self.fleet is not None:
+            self.fleet.write(self._state, state)
+        else:
+            self._state = state
 
     @staticmethod
     def turn(state: State, steer: Steer, turn_length: int) -> State:
@@ -112,12 +147,16 @@ class Car(Agent):
             state.rotation_speed = 0
             state.steer = Steer.Forward
 
-        new_x, new_y = state.x, state.y
-        new_direction = state.direction
-        for step in range(state.velocity):
-            new_direction = self._get_new_direction(new_direction, turn / state.velocity)
-            new_x += new_direction[0]
-            new_y += new_direction[1]
+        if self.closed_form_turns:
+            dx, dy = self._get_turn_displacement(state.direction, turn / state.velocity, state.velocity)
+            new_x, new_y = state.x + dx, state.y + dy
+        else:
+            new_x, new_y = state.x, state.y
+            new_direction = state.direction
+            for step in range(state.velocity):
+                new_direction = self._get_new_direction(new_direction, turn / state.velocity)
+                new_x += new_direction[0]
+                new_y += new_direction[1]
         self.rotate(state, turn)
         state.x, state.y = new_x, new_y
         return state
@@ -134,7 +173,12 @@ class Car(Agent):
         return state
 
     def step(self):
-        self.state = self.simulate(self.state, 1, False)
+        if self.fleet is not None:
+            return
+        if self.trajectories is not None:
+            self.state = self.trajectories.next_state(self, self.state, False)
+        else:
+            self.state = self.simulate(self.state, 1, False)
 
     def rotate(self, state: State, angle: float):
         state.direction = self._get_new_direction(state.direction, angle)
@@ -158,15 +202,27 @@ class Car(Agent):
         new_y = current[0] * sin(angle) + current[1] * cos(angle)
         return new_x, new_y
 
+    @staticmethod
+    def _get_turn_displacement(direction: Tuple[float, float], angle: float, steps: int) -> Tuple[float, float]:
+        """
+        Sum of unit moves, each one rotated by angle more than the previous one, in a closed form
+        :param direction: direction before the first move
+        :param angle: rotation applied before every move
+        :param steps: number of moves
+        """
+        if angle == 0:
+            return direction[0] * steps, direction[1] * steps
+        scale = sin(steps * angle / 2) / sin(angle / 2)
+        dx, dy = Car._get_new_direction(direction, (steps + 1) * angle / 2)
+        return dx * scale, dy * scale
+
     @staticmethod
     def _get_new_right_angle_direction(direction: Tuple[float, float], angle: float) -> Tuple[float, float]:
         new_x, new_y = Car._get_new_direction(direction, angle)
         return round(new_x), round(new_y)
 
-    @staticmethod
-    def random_color():
-        from autonomous_intersection.model import Intersection
-        return Intersection.random.choice(
+    def random_color(self):
+        return self.random.choice(
             ["magenta", "cyan", "lime", "purple", "violet", "green", "red", "black", "yellow",
              "blue", "white", "brown"])
 
@@ -189,6 +245,8 @@ class Car(Agent):
 
     @property
     def new_rect(self) -> Rect:
+        if self.trajectories is not None:
+            return self.trajectories.next_rect(self)
         next_ = self.simulate(self.state, 1)
         return Rect(next_.x - self.width // 2, next_.y - self.height // 2, self.width, self.height, next_.rotation)
 
@@ -211,6 +269,8 @@ class Car(Agent):
         return Steer.Left
 
     def stop(self, state: State = None):
+        if state is None:
+            self.stop_decisions += 1
         state = state if state is not None else self.state
         state.target_velocity = 0
 
@@ -0,0 +1,191 @@
+import math
+from typing import List
+
+import numpy as np
+
+import autonomous_intersection.agents.car
+from autonomous_intersection.agents.direction import Steer
+from autonomous_intersection.line import Axis
+
+STEERS = (Steer.Forward, Steer.Left, Steer.Right)
+FORWARD, LEFT, RIGHT = range(len(STEERS))
+
+
+class _Column:
+    def __init__(self, cast):
+        self.cast = cast
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, view: "FleetState", owner=None):
+        if view is None:
+            return self
+        return self.cast(getattr(view.fleet, self.name)[view.row])
+
+    def __set__(self, view: "FleetState", value):
+        getattr(view.fleet, self.name)[view.row] = value
+
+
+class FleetState:
+    """
+    Car.State stored in a row of a CarFleet
+    """
+    __slots__ = ("fleet", "row")
+
+    x = _Column(float)
+    y = _Column(float)
+    rotation = _Column(float)
+    velocity = _Column(int)
+    rotation_speed = _Column(float)
+    target_angle = _Column(float)
+    needs_turn = _Column(bool)
+    target_velocity = _Column(int)
+    delay = _Column(int)
+
+    def __init__(self, fleet: "CarFleet", row: int):
+        self.fleet = fleet
+        self.row = row
+
+    @property
+    def direction(self):
+        return float(self.fleet.dx[self.row]), float(self.fleet.dy[self.row])
+
+    @direction.setter
+    def direction(self, value):
+        self.fleet.dx[self.row], self.fleet.dy[self.row] = value
+
+    @property
+    def steer(self) -> Steer:
+        return STEERS[self.fleet.steer[self.row]]
+
+    @steer.setter
+    def steer(self, value: Steer):
+        self.fleet.steer[self.row] = STEERS.index(value)
+
+    def copy(self) -> "autonomous_intersection.agents.car.Car.State":
+        return autonomous_intersection.agents.car.Car.State(
+            self.x, self.y, self.rotation, self.velocity, self.direction, self.rotation_speed, self.steer,
+            self.target_angle, self.needs_turn, self.target_velocity, self.delay)
+
+    def key(self, ignore_target_velocity: bool = False) -> tuple:
+        return self.copy().key(ignore_target_velocity)
+
+
+class CarFleet:
+    """
+    Kinematic state of cars stored column-wise, all cars are stepped with one vectorized update
+    that is equivalent to Car.simulate(state, 1, False), turns use the closed form displacement
+    """
+    STATE_COLUMNS = {"x": float, "y": float, "rotation": float, "velocity": int, "dx": float, "dy": float,
+                     "rotation_speed": float, "steer": np.int8, "target_angle": float, "needs_turn": bool,
+                     "target_velocity": int, "delay": int}
+    CAR_COLUMNS = {"width": int, "acceleration": int, "deceleration": int, "steer_direction": np.int8,
+                   "horizontal": bool, "target_line": float, "active": bool}
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        for name, dtype in {**self.STATE_COLUMNS, **self.CAR_COLUMNS}.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.free: List[int] = []
+        self.size = 0
+
+    def __len__(self):
+        return self.size - len(self.free)
+
+    def _grow(self) -> None:
+        for name in {**self.STATE_COLUMNS, **self.CAR_COLUMNS}:
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate((column, np.zeros_like(column))))
+        self.capacity *= 2
+
+    def add(self, car: "autonomous_intersection.agents.car.Car",
+            state: "autonomous_intersection.agents.car.Car.State") -> FleetState:
+        if self.free:
+            row = self.free.pop()
+        else:
+            if self.size == self.capacity:
+                self._grow()
+            row = self.size
+            self.size += 1
+        self.width[row] = car.width
+        self.acceleration[row] = car.acceleration
+        self.deceleration[row] = car.deceleration
+        self.steer_direction[row] = STEERS.index(car.steer_direction)
+        self.horizontal[row] = car.start_line.axis == Axis.Horizontal
+        self.target_line[row] = car.target_line.position
+        self.active[row] = True
+        view = FleetState(self, row)
+        self.write(view, state)
+        return view
+
+    def remove(self, view: FleetState) -> None:
+        self.active[view.row] = False
+        self.free.append(view.row)
+
+    @staticmethod
+    def write(view: FleetState, state: "autonomous_intersection.agents.car.Car.State") -> None:
+        view.x, view.y, view.rotation, view.velocity = state.x, state.y, state.rotation, state.velocity
+        view.direction, view.rotation_speed, view.steer = state.direction, state.rotation_speed, state.steer
+        view.target_angle, view.needs_turn = state.target_angle, state.needs_turn
+        view.target_velocity, view.delay = state.target_velocity, state.delay
+
+    def step(self) -> None:
+        rows = np.flatnonzero(self.active[:self.size])
+        self.adjust_velocity(rows)
+        self.move(rows)
+        self.start_turns(rows)
+        delayed = rows[self.delay[rows] > 0]
+        self.delay[delayed] -= 1
+
+    def adjust_velocity(self, rows: np.ndarray) -> None:
+        rows = rows[self.delay[rows] <= 1]
+        velocity, target = self.velocity[rows], self.target_velocity[rows]
+        velocity = np.where(target > velocity, np.minimum(target, velocity + self.acceleration[rows]), velocity)
+        velocity = np.where(target < velocity, np.maximum(0, velocity - self.deceleration[rows]), velocity)
+        self.velocity[rows] = velocity
+
+    def move(self, rows: np.ndarray) -> None:
+        rows = rows[self.velocity[rows] != 0]
+        velocity = self.velocity[rows]
+        turn = self.rotation_speed[rows] * velocity
+
+        straight = rows[turn == 0]
+        self.x[straight] += self.dx[straight] * self.velocity[straight]
+        self.y[straight] += self.dy[straight] * self.velocity[straight]
+
+        turning = turn != 0
+        rows, turn, velocity = rows[turning], turn[turning], velocity[turning]
+        rotation, steer, target_angle = self.rotation[rows], self.steer[rows], self.target_angle[rows]
+        new_rotation = rotation + turn
+        finished = ((steer == RIGHT) & (new_rotation > target_angle)) | ((steer == LEFT) & (new_rotation < target_angle))
+        turn = np.where(finished, target_angle - rotation, turn)
+        self.rotation_speed[rows[finished]] = 0
+        self.steer[rows[finished]] = FORWARD
+
+        dx, dy = self.dx[rows], self.dy[rows]
+        angle = turn / velocity
+        scale = np.sin(velocity * angle / 2) / np.sin(angle / 2)
+        half = (velocity + 1) * angle / 2
+        self.x[rows] += (dx * np.cos(half) - dy * np.sin(half)) * scale
+        self.y[rows] += (dx * np.sin(half) + dy * np.cos(half)) * scale
+        self.dx[rows] = dx * np.cos(turn) - dy * np.sin(turn)
+        self.dy[rows] = dx * np.sin(turn) + dy * np.cos(turn)
+        self.rotation[rows] = rotation + turn
+
+    def start_turns(self, rows: np.ndarray) -> None:
+        rows = rows[self.needs_turn[rows]]
+        distance = np.where(self.horizontal[rows], np.abs(self.x[rows] - self.target_line[rows]),
+                            np.abs(self.y[rows] - self.target_line[rows]))
+        starting = 2 * self.width[rows] > distance
+        rows, distance = rows[starting], distance[starting]
+        steer = self.steer_direction[rows]
+        with np.errstate(divide="ignore"):
+            speed = (math.pi / 2) / (0.5 * math.pi * distance)
+        rotation = self.rotation[rows]
+        self.steer[rows] = steer
+        self.rotation_speed[rows] = np.where(steer == LEFT, -speed, np.where(steer == RIGHT, speed, 0))
+        self.target_angle[rows] = np.where(steer == LEFT, rotation - math.pi / 2,
+                                           np.where(steer == RIGHT, rotation + math.pi / 2, rotation))
+        self.needs_turn[rows] = False
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+PACKAGE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DIRECTORY = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+                                 "autonomous_intersection")
+
+
+@lru_cache(maxsize=None)
+def source_version() -> str:
+    """
+    :return: hash of the source files of the package, any change of the code gives a new version
+    """
+    digest = hashlib.sha256()
+    for root, directories, files in os.walk(PACKAGE_DIRECTORY):
+        directories.sort()
+        for name in sorted(files):
+            if name.endswith(".py"):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, PACKAGE_DIRECTORY).encode())
+                with open(path, "rb") as file:
+                    digest.update(file.read())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Results of deterministic runs stored as JSON files named after the hash of the run parameters,
+    the seed, the number of steps and the source version. Hits refresh the modification time,
+    so eviction removes the least recently used entries first.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, max_bytes: int = 256 * 2 ** 20,
+                 max_age: float = 30 * 24 * 3600):
+        """
+        :param max_bytes: total size of the entries kept by evict
+        :param max_age: seconds since the last use after which evict removes an entry
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(parameters: Dict[str, Any]) -> str:
+        """
+        :param parameters: JSON serializable parameters of the run including the seed and the number of steps
+        """
+        content = json.dumps({"parameters": parameters, "source": source_version()}, sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, parameters: Dict[str, Any]) -> Optional[dict]:
+        path = self.path(self.key(parameters))
+        try:
+            with open(path) as file:
+                result = json.load(file)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, parameters: Dict[str, Any], result: dict) -> None:
+        """
+        Writes to a temporary file first, so an interrupted write never leaves a broken entry
+        """
+        path = self.path(self.key(parameters))
+        temporary = F"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(result, file)
+        os.replace(temporary, path)
+
+    def evict(self) -> int:
+        """
+        Removes entries unused for longer than max_age, then the least recently used ones
+        until the cache fits in max_bytes
+        :return: number of removed entries
+        """
+        now = time.time()
+        entries = []
+        removed = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                status = os.stat(path)
+            except OSError:
+                continue
+            if now - status.st_mtime > self.max_age:
+                removed += self._remove(path)
+            else:
+                entries.append((status.st_mtime, status.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            removed += self._remove(path)
+            total -= size
+        return removed
+
+    @staticmethod
+    def _remove(path: str) -> int:
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
@@ -0,0 +1,159 @@
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from autonomous_intersection.agents.car import Car
+from autonomous_intersection.rect import Rect
+
+
+def bounding_boxes(rects: Iterable[Rect]) -> np.ndarray:
+    """
+    :return: array of shape (n, 4) with left, top, right and bottom of every rect
+    """
+    return np.array([rect.aabb for rect in rects], dtype=float).reshape(-1, 4)
+
+
+def overlap(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """
+    Same test as Rect.overlaps for bounding boxes broadcast against each other along the last axis
+    """
+    return ~((second[..., 0] > first[..., 2]) | (second[..., 2] < first[..., 0]) |
+             (second[..., 1] > first[..., 3]) | (second[..., 3] < first[..., 1]))
+
+
+def overlap_matrix(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """
+    :return: boolean array of shape (len(first), len(second))
+    """
+    return overlap(first[:, np.newaxis, :], second[np.newaxis, :, :])
+
+
+def refine(hits: np.ndarray, first: List[Rect], second: List[Rect], indices: np.ndarray) -> None:
+    """
+    Clears pairs with overlapping bounding boxes whose rotated rects do not overlap
+    :param indices: position in second of the rect compared in every column of hits
+    """
+    for row, column in zip(*np.nonzero(hits)):
+        rect, other = first[row], second[indices[row, column]]
+        if not (rect.is_axis_aligned and other.is_axis_aligned) and not rect.separating_axis_test(other):
+            hits[row, column] = False
+
+
+Group = Tuple[List[Car], Optional[np.ndarray], Optional[Rect], bool]
+"""Arguments of CollisionMap: cars, their neighbours, the zone rect and exact"""
+
+
+class CollisionMap:
+    """
+    Collision stage of IntersectionManager.control_cars computed for all cars at once.
+    Car at a given index collides if its next rect overlaps current rect of any other car
+    or next rect of any car accepted before it.
+
+    Without neighbours every pair of cars is checked. With neighbours (positions of other cars in the same lane,
+    -1 if missing) each car is checked against them and against all cars near the zone rect.
+    With exact, overlapping bounding boxes are confirmed as in Rect.overlaps.
+    """
+
+    def __init__(self, cars: Iterable[Car], neighbours: Optional[np.ndarray] = None, zone: Optional[Rect] = None,
+                 exact: bool = False):
+        self._build(*_broad_phase([(list(cars), neighbours, zone, exact)])[0])
+
+    @classmethod
+    def batch(cls, groups: Sequence[Group]) -> List["CollisionMap"]:
+        """
+        Collision maps of independent groups of cars, e.g. replicas of a model sharing coordinates.
+        Bounding boxes of all groups are tested in one pass, every car only against the cars of its group,
+        so every map is the same as CollisionMap(*group).
+        """
+        maps = []
+        for parts in _broad_phase(groups):
+            collisions = cls.__new__(cls)
+            collisions._build(*parts)
+            maps.append(collisions)
+        return maps
+
+    def _build(self, cars: List[Car], new_rects: List[Rect], zone: np.ndarray, neighbours: np.ndarray,
+               blocked: np.ndarray, zone_upcoming: np.ndarray, neighbour_upcoming: np.ndarray) -> None:
+        self.cars = cars
+        self.new_rects = new_rects
+        self.zone = zone
+        self.neighbours = neighbours
+        self.blocked = blocked
+        self.zone_upcoming = zone_upcoming
+        self.neighbour_upcoming = neighbour_upcoming
+        self.accepted: np.ndarray = np.zeros(len(cars), dtype=bool)
+
+    def collides(self, index: int) -> bool:
+        return bool(self.blocked[index] or np.any(self.zone_upcoming[index] & self.accepted[self.zone]) or np.any(
+            self.neighbour_upcoming[index] & self.accepted[self.neighbours[index]]))
+
+    def accept(self, index: int) -> None:
+        self.accepted[index] = True
+
+
+def _broad_phase(groups: Sequence[Group]) -> List[tuple]:
+    """
+    Zone pairs are tested in padded arrays of shape (groups, cars, zone cars), so each car is only compared
+    with the cars of its own group and the work grows linearly with the number of groups
+    :return: arguments of CollisionMap._build for every group
+    """
+    cars = [car for group_cars, *_ in groups for car in group_cars]
+    sizes = np.array([len(group_cars) for group_cars, *_ in groups], dtype=int)
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+    rects = [car.rect() for car in cars]
+    new_rects = [car.new_rect for car in cars]
+    current = bounding_boxes(rects)
+    upcoming = bounding_boxes(new_rects)
+
+    # without neighbours the zone of a group holds all its cars
+    width = max([0] + [neighbours.shape[1] for _, neighbours, _, _ in groups if neighbours is not None])
+    neighbours = np.full((len(cars), width), -1, dtype=int)
+    zones = []
+    for index, (_, group_neighbours, zone, _) in enumerate(groups):
+        rows = slice(offsets[index], offsets[index + 1])
+        if group_neighbours is not None:
+            zone_box = np.array(zone.aabb, dtype=float)
+            zones.append(np.flatnonzero(overlap(current[rows], zone_box) | overlap(upcoming[rows], zone_box)))
+            neighbours[rows, :group_neighbours.shape[1]] = np.where(group_neighbours >= 0,
+                                                                    group_neighbours + offsets[index], -1)
+        else:
+            zones.append(np.arange(sizes[index]))
+    valid = neighbours >= 0
+    neighbour_hits = overlap(upcoming[:, np.newaxis, :], current[neighbours]) & valid
+    neighbour_upcoming = overlap(upcoming[:, np.newaxis, :], upcoming[neighbours]) & valid
+
+    # rows and columns of the padded arrays, padding repeats the first car of the whole batch and is masked out
+    length = max([0] + [len(zone) for zone in zones])
+    rows = np.zeros((len(groups), max([0] + sizes.tolist())), dtype=int)
+    columns = np.zeros((len(groups), length), dtype=int)
+    in_zone = np.zeros(columns.shape, dtype=bool)
+    for index, zone in enumerate(zones):
+        rows[index, :sizes[index]] = np.arange(offsets[index], offsets[index + 1])
+        columns[index, :len(zone)] = zone + offsets[index]
+        in_zone[index, :len(zone)] = True
+    padded = upcoming[rows][:, :, np.newaxis, :]
+    zone_hits = overlap(padded, current[columns][:, np.newaxis, :, :]) & in_zone[:, np.newaxis, :]
+    zone_upcoming = overlap(padded, upcoming[columns][:, np.newaxis, :, :]) & in_zone[:, np.newaxis, :]
+
+    result = []
+    for index, (group_cars, group_neighbours, _, exact) in enumerate(groups):
+        start, end = offsets[index], offsets[index + 1]
+        group_zone = zones[index]
+        parts = [part[index, :len(group_cars), :len(group_zone)] for part in (zone_hits, zone_upcoming)]
+        parts[0][group_zone, np.arange(len(group_zone))] = False
+        if group_neighbours is None:
+            group_neighbours = np.empty((len(group_cars), 0), dtype=int)
+        width = group_neighbours.shape[1]
+        parts += [part[start:end, :width] for part in (neighbour_hits, neighbour_upcoming)]
+        group_zone_hits, group_zone_upcoming, group_neighbour_hits, group_neighbour_upcoming = parts
+        group_rects, group_new_rects = rects[start:end], new_rects[start:end]
+        if exact:
+            broadcast_zone = np.broadcast_to(group_zone, group_zone_hits.shape)
+            refine(group_zone_hits, group_new_rects, group_rects, broadcast_zone)
+            refine(group_neighbour_hits, group_new_rects, group_rects, group_neighbours)
+            refine(group_zone_upcoming, group_new_rects, group_new_rects, broadcast_zone)
+            refine(group_neighbour_upcoming, group_new_rects, group_new_rects, group_neighbours)
+        blocked = group_zone_hits.any(axis=1) | group_neighbour_hits.any(axis=1)
+        result.append((group_cars, group_new_rects, group_zone, group_neighbours, blocked, group_zone_upcoming,
+                       group_neighbour_upcoming))
+    return result
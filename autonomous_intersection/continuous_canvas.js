@@ -71,6 +71,50 @@ var ContinuousVisualization = function(height, width, context) {
 	};
 };
 
+var FrameDecoder = function() {
+	// Layout of FrameEncoder in continuous_canvas.py
+	var SHAPES = ["simplerect", "rect", "circle"];
+	var FILLED = 4;
+	var RECORD_SIZE = 28;
+	var HEADER_SIZE = 8;
+	var agents = new Map();
+	var palette = [];
+
+	this.decode = function(data) {
+		if (data.keyframe) {
+			agents.clear();
+			palette = [];
+		}
+		palette.push.apply(palette, data.palette);
+		var binary = atob(data.frame);
+		var bytes = new Uint8Array(binary.length);
+		for (var i = 0; i < binary.length; i++)
+			bytes[i] = binary.charCodeAt(i);
+		var view = new DataView(bytes.buffer);
+		var updates = view.getUint32(0, true);
+		var removals = view.getUint32(4, true);
+		var offset = HEADER_SIZE;
+		for (var i = 0; i < updates; i++, offset += RECORD_SIZE) {
+			var flags = view.getUint8(offset + 26);
+			agents.set(view.getUint32(offset, true), {
+				x: view.getFloat32(offset + 4, true),
+				y: view.getFloat32(offset + 8, true),
+				rotation: view.getFloat32(offset + 12, true),
+				w: view.getFloat32(offset + 16, true),
+				r: view.getFloat32(offset + 16, true),
+				h: view.getFloat32(offset + 20, true),
+				Color: palette[view.getUint16(offset + 24, true)],
+				Shape: SHAPES[flags & 3],
+				Filled: (flags & FILLED) !== 0,
+				Layer: view.getInt8(offset + 27)
+			});
+		}
+		for (var i = 0; i < removals; i++, offset += 4)
+			agents.delete(view.getUint32(offset, true));
+		return Array.from(agents.values());
+	};
+};
+
 var Simple_Continuous_Module = function(canvas_width, canvas_height) {
 	// Create the element
 	// ------------------
@@ -86,12 +130,28 @@ var Simple_Continuous_Module = function(canvas_width, canvas_height) {
 	var context = canvas.getContext("2d");
 	var canvasDraw = new ContinuousVisualization(canvas_width, canvas_height, context);
 
+	// Static background, drawn once to an offscreen canvas and copied under every frame
+	var background = document.createElement("canvas");
+	background.width = canvas_width;
+	background.height = canvas_height;
+	var backgroundDraw = new ContinuousVisualization(canvas_width, canvas_height, background.getContext("2d"));
+
+	// Agents of binary frames, each frame carries only changes against the previous one
+	var decoder = new FrameDecoder();
+
 	this.render = function(data) {
+		if (data.background) {
+			backgroundDraw.resetCanvas();
+			backgroundDraw.draw(data.background);
+		}
 		canvasDraw.resetCanvas();
-		canvasDraw.draw(data);
+		context.drawImage(background, 0, 0);
+		canvasDraw.draw(data.frame !== undefined ? decoder.decode(data) : data.agents);
 	};
 
 	this.reset = function() {
+		decoder = new FrameDecoder();
+		backgroundDraw.resetCanvas();
 		canvasDraw.resetCanvas();
 	};
 
@@ -1,4 +1,83 @@
-from mesa.visualization.ModularVisualization import VisualizationElement
+import base64
+import struct
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+from mesa import Model
+from mesa.visualization.ModularVisualization import ModularServer, SocketHandler, VisualizationElement
+
+SHAPES = ("simplerect", "rect", "circle")
+FILLED = 4
+RECORD = struct.Struct("<I5fHBb")
+"""Agent id, x, y, rotation, width, height, palette index, shape with the filled flag and layer"""
+HEADER = struct.Struct("<II")
+"""Numbers of updated and removed agents"""
+
+
+class FrameEncoder:
+    """
+    Binary frames with records of agents that were added or changed since the previous frame and ids of
+    agents that were removed. Colours are sent once as palette entries, records refer to them by index.
+    Frames are base64 encoded, so they can be sent in the JSON messages of the visualization server.
+    """
+
+    def __init__(self):
+        self.ids: Dict[Any, int] = {}
+        self.records: Dict[int, bytes] = {}
+        self.palette: Dict[str, int] = {}
+        self.next_id = 0
+
+    def reset(self) -> None:
+        self.__init__()
+
+    def _pack(self, agent_id: int, portrayal: dict) -> bytes:
+        flags = SHAPES.index(portrayal["Shape"]) | (FILLED if portrayal.get("Filled") else 0)
+        return RECORD.pack(agent_id, portrayal["x"], portrayal["y"], portrayal.get("rotation", 0),
+                           portrayal.get("w", portrayal.get("r", 0)), portrayal.get("h", 0),
+                           self.palette[portrayal["Color"]], flags, portrayal["Layer"])
+
+    def encode(self, agents: Iterable[Any], portrayal_method: Callable[[Any], dict], keyframe: bool = False) -> dict:
+        """
+        :param keyframe: forget the previous frame, the palette and the ids and send every agent
+        """
+        if keyframe:
+            self.reset()
+        colors: List[str] = []
+        updates: List[bytes] = []
+        seen = set()
+        for agent in agents:
+            agent_id = self.ids.get(agent)
+            if agent_id is None:
+                agent_id = self.ids[agent] = self.next_id
+                self.next_id += 1
+            seen.add(agent_id)
+            portrayal = portrayal_method(agent)
+            if portrayal["Color"] not in self.palette:
+                self.palette[portrayal["Color"]] = len(self.palette)
+                colors.append(portrayal["Color"])
+            record = self._pack(agent_id, portrayal)
+            if self.records.get(agent_id) != record:
+                self.records[agent_id] = record
+                updates.append(record)
+        removed = [agent_id for agent_id in self.records if agent_id not in seen]
+        if removed:
+            for agent_id in removed:
+                del self.records[agent_id]
+            self.ids = {agent: agent_id for agent, agent_id in self.ids.items() if agent_id in seen}
+        frame = HEADER.pack(len(updates), len(removed)) + b"".join(updates) + struct.pack(
+            F"<{len(removed)}I", *removed)
+        return {"keyframe": keyframe, "palette": colors, "frame": base64.b64encode(frame).decode("ascii")}
+
+
+class Viewer:
+    """
+    What a connection has been sent so far
+    """
+
+    def __init__(self, binary: bool):
+        self.model: Optional[Model] = None
+        """Model whose background was sent"""
+        self.encoder = FrameEncoder() if binary else None
+        """Frames of the viewer, each one is a delta against the previous frame sent to it"""
 
 
 class ContinuousCanvas(VisualizationElement):
@@ -7,9 +86,10 @@ class ContinuousCanvas(VisualizationElement):
     canvas_height = 500
     canvas_width = 500
 
-    def __init__(self, portrayal_method, canvas_height=500, canvas_width=500):
+    def __init__(self, portrayal_method, canvas_height=500, canvas_width=500, binary=False):
         """
         Instantiate a new SimpleCanvas
+        :param binary: send agents in delta encoded binary frames instead of lists of portrayals
         """
         super(ContinuousCanvas, self).__init__()
         self.portrayal_method = portrayal_method
@@ -19,9 +99,57 @@ class ContinuousCanvas(VisualizationElement):
             self.canvas_width, self.canvas_height
         )
         self.js_code = "elements.push(" + new_element + ");"
+        self.binary = binary
+        self.viewers: Dict[Hashable, Viewer] = {}
 
-    def render(self, model):
-        space_state = []
-        for obj in model.schedule.agents:
-            space_state.append(self.portrayal_method(obj))
+    def render(self, model, viewer: Hashable = None):
+        """
+        :param viewer: connection the state is sent to (see CanvasServer), None if all connections get the same.
+        Binary frames are deltas against the previous frame of the same viewer.
+        :return: portrayals of agents of the schedule and visible overlay markers, the static background
+        is included only in the first frame of every model sent to the viewer, which is also a key frame
+        in binary mode
+        """
+        state = self.viewers.get(viewer)
+        if state is None:
+            state = self.viewers[viewer] = Viewer(self.binary)
+        first = model is not state.model
+        agents = [*model.schedule.agents, *model.overlay.visible_markers()]
+        if state.encoder is not None:
+            space_state = state.encoder.encode(agents, self.portrayal_method, first)
+        else:
+            space_state = {"agents": [self.portrayal_method(obj) for obj in agents]}
+        if first:
+            space_state["background"] = [self.portrayal_method(cell) for cell in model.background]
+            state.model = model
         return space_state
+
+    def forget(self, viewer: Hashable) -> None:
+        self.viewers.pop(viewer, None)
+
+
+class CanvasSocketHandler(SocketHandler):
+    """
+    Renders canvas elements for every connection separately, so that each one gets the background
+    and the frames it has not seen yet
+    """
+
+    @property
+    def viz_state_message(self):
+        model = self.application.model
+        return {"type": "viz_state",
+                "data": [element.render(model, self) if isinstance(element, ContinuousCanvas) else element.render(model)
+                         for element in self.application.visualization_elements]}
+
+    def on_close(self):
+        for element in self.application.visualization_elements:
+            if isinstance(element, ContinuousCanvas):
+                element.forget(self)
+
+
+class CanvasServer(ModularServer):
+    """
+    ModularServer rendering ContinuousCanvas elements per connection, several browser tabs can view one model
+    """
+    socket_handler = (r"/ws", CanvasSocketHandler)
+    handlers = [ModularServer.page_handler, socket_handler, ModularServer.static_handler, ModularServer.local_handler]
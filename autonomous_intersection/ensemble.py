@@ -0,0 +1,52 @@
+from typing import Any, List, Sequence
+
+import numpy as np
+
+from autonomous_intersection.agents.fleet import CarFleet
+from autonomous_intersection.collision_map import CollisionMap
+from autonomous_intersection.model import Intersection
+
+
+class Ensemble:
+    """
+    Replicas of one configuration with different seeds stepped in lockstep, e.g. to compare their rate series
+    step by step. The cars of all replicas are stored in one CarFleet and advanced by a single vectorized update,
+    the collision broad phase of all replicas is computed in one pass (see CollisionMap.batch).
+    Spawning and the sequential decisions of the managers stay per replica, every replica has its own random
+    generator. The time per step grows linearly with the number of replicas, an ensemble gives no per-core
+    throughput gain over separate models.
+    Each replica gives the same results as a single model with the same seed and fleet=True.
+    """
+
+    def __init__(self, seeds: Sequence[int], **parameters: Any):
+        self.fleet = CarFleet()
+        parameters = {**parameters, "fleet": self.fleet, "fast_forward": False}
+        self.replicas: List[Intersection] = [Intersection(seed=seed, **parameters) for seed in seeds]
+        self.rates: List[List[int]] = [[] for _ in self.replicas]
+
+    def step(self) -> None:
+        for replica in self.replicas:
+            replica.profiler.start_step()
+            replica.update_cars()
+        groups = [replica.manager.collision_group() for replica in self.replicas]
+        for replica, collisions in zip(self.replicas, CollisionMap.batch(groups)):
+            replica.control_cars(collisions)
+        self.fleet.step()
+        for replica, rates in zip(self.replicas, self.rates):
+            replica.finish_step()
+            rates.append(replica.get_agent_rate())
+
+    def run(self, steps: int) -> np.ndarray:
+        for _ in range(steps):
+            self.step()
+        return self.rate_series()
+
+    def close(self) -> None:
+        for replica in self.replicas:
+            replica.close()
+
+    def rate_series(self) -> np.ndarray:
+        """
+        :return: array of shape (replicas, steps) with get_agent_rate of every replica after every step
+        """
+        return np.array(self.rates, dtype=int).reshape(len(self.replicas), -1)
@@ -0,0 +1,174 @@
+from bisect import bisect_right
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from autonomous_intersection.agents.car import Car
+from autonomous_intersection.agents.direction import Direction
+from autonomous_intersection.rect import Rect
+
+
+class LaneIndex:
+    """
+    Cars ordered by distance travelled along the lane they currently drive on, front car first.
+    A car belongs to the lane of its entry until it starts turning, then to the lane of its target.
+
+    Cars that have not reached the intersection yet are also kept in a queue per entry. Only the front car
+    of such a queue can reach the intersection or start turning, so only the queue fronts and the few cars
+    crossing the intersection are checked on refresh. A car that starts turning joins the target lane before
+    it is physically there, so it takes its place in the lane once more after leaving the zone.
+    """
+
+    def __init__(self, intersection: Rect, margin: float, entries: Dict[Direction, Tuple[int, int]],
+                 exact: bool = False):
+        self.lanes: Dict[Direction, List[Car]] = {direction: [] for direction in Direction}
+        self.lane_of: Dict[Car, Direction] = {}
+        self.approaches: Dict[Direction, Deque[Car]] = {direction: deque() for direction in Direction}
+        self.crossing: Dict[Car, bool] = {}
+        """Cars between their entry queue and the exit of the zone, True once the car was inside the zone"""
+        self.intersection = intersection
+        self.exact = exact
+        self.zone = Rect(intersection.left - margin, intersection.top - margin,
+                         intersection.width + 2 * margin, intersection.height + 2 * margin)
+        self.entries = {direction: self._progress(*position, direction) for direction, position in entries.items()}
+        corners = [(x, y) for x in (self.zone.left, self.zone.right) for y in (self.zone.top, self.zone.bottom)]
+        self.zone_entries = {direction: min(self._progress(x, y, direction) for x, y in corners)
+                             for direction in Direction}
+        self.longest = 0
+
+    @staticmethod
+    def current_lane(car: Car) -> Direction:
+        return car.initial_direction if car.state.needs_turn else car.target
+
+    @staticmethod
+    def _progress(x: float, y: float, direction: Direction) -> float:
+        dx, dy = direction.velocity
+        return x * dx + y * dy
+
+    @staticmethod
+    def progress(car: Car, direction: Direction) -> float:
+        return LaneIndex._progress(car.x, car.y, direction)
+
+    def distance_to_zone(self, car: Car, direction: Direction) -> float:
+        """
+        :return: distance between the front of a car driving in the direction and the zone
+        """
+        return self.zone_entries[direction] - self.progress(car, direction) - car.width / 2
+
+    def queue_length(self, direction: Direction) -> int:
+        """
+        :return: number of cars from the entry that have not reached the intersection
+        """
+        return len(self.approaches[direction])
+
+    def spawn(self, car: Car) -> None:
+        """
+        Adds a car that has just entered from the edge
+        """
+        self.add(car)
+        self.approaches[car.initial_direction].append(car)
+        self.longest = max(self.longest, car.width, car.height)
+
+    def add(self, car: Car) -> None:
+        direction = self.current_lane(car)
+        lane = self.lanes[direction]
+        keys = [-self.progress(other, direction) for other in lane]
+        lane.insert(bisect_right(keys, -self.progress(car, direction)), car)
+        self.lane_of[car] = direction
+
+    def remove(self, car: Car) -> None:
+        self.lanes[self.lane_of.pop(car)].remove(car)
+        if car in self.crossing:
+            del self.crossing[car]
+        elif car in self.approaches[car.initial_direction]:
+            self.approaches[car.initial_direction].remove(car)
+
+    def refresh(self) -> None:
+        """
+        Moves cars that reached the intersection out of their entry queue
+        and cars that started turning to the lane of their target
+        """
+        for direction, queue in self.approaches.items():
+            while queue and (self.current_lane(queue[0]) != direction or
+                             self.intersection.overlaps(queue[0].rect(), self.exact)):
+                self.crossing[queue.popleft()] = False
+        for car, inside in list(self.crossing.items()):
+            if self.lane_of[car] != self.current_lane(car):
+                self.lanes[self.lane_of.pop(car)].remove(car)
+                self.add(car)
+            if self.zone.overlaps(car.rect(), self.exact):
+                self.crossing[car] = True
+            elif inside:
+                del self.crossing[car]
+                self._reinsert(car)
+
+    def _reinsert(self, car: Car) -> None:
+        """
+        Moves the car behind the last car ahead of it, cars still crossing the zone are skipped
+        """
+        direction = self.lane_of[car]
+        lane = self.lanes[direction]
+        lane.remove(car)
+        progress = self.progress(car, direction)
+        index = 0
+        for position, other in enumerate(lane):
+            if other in self.crossing:
+                continue
+            if self.progress(other, direction) < progress:
+                break
+            index = position + 1
+        lane.insert(index, car)
+
+    def get_state(self) -> dict:
+        """
+        :return: order of cars in lanes and queues by car ids
+        """
+        return {"lanes": {direction: [car.unique_id for car in lane] for direction, lane in self.lanes.items()},
+                "approaches": {direction: [car.unique_id for car in queue]
+                               for direction, queue in self.approaches.items()},
+                "crossing": [(car.unique_id, inside) for car, inside in self.crossing.items()],
+                "longest": self.longest}
+
+    def set_state(self, state: dict, cars: Dict[int, Car]) -> None:
+        self.lanes = {direction: [cars[car_id] for car_id in lane] for direction, lane in state["lanes"].items()}
+        self.lane_of = {car: direction for direction, lane in self.lanes.items() for car in lane}
+        self.approaches = {direction: deque(cars[car_id] for car_id in queue)
+                           for direction, queue in state["approaches"].items()}
+        self.crossing = {cars[car_id]: inside for car_id, inside in state["crossing"]}
+        self.longest = state["longest"]
+
+    def near_entry(self, direction: Direction, distance: float) -> Iterator[Car]:
+        """
+        :return: cars from the entry closer to it than the distance, back of the queue first
+        """
+        for car in reversed(self.approaches[direction]):
+            if self.progress(car, direction) - self.entries[direction] > distance:
+                return
+            yield car
+
+    def leaving(self, is_out: Callable[[Car], bool]) -> List[Car]:
+        """
+        :return: cars that drove out, every lane is checked from the front up to the first car that is still in
+        and already left the zone
+        """
+        result = []
+        for lane in self.lanes.values():
+            for car in lane:
+                if is_out(car):
+                    result.append(car)
+                elif car not in self.crossing:
+                    break
+        return result
+
+    def neighbour_indices(self, cars: List[Car]) -> np.ndarray:
+        """
+        :return: array of shape (len(cars), 2) with positions of leader and follower in cars, -1 if there is none
+        """
+        positions = {car: index for index, car in enumerate(cars)}
+        result = np.full((len(cars), 2), -1, dtype=int)
+        for lane in self.lanes.values():
+            for leader, follower in zip(lane, lane[1:]):
+                result[positions[follower], 0] = positions[leader]
+                result[positions[leader], 1] = positions[follower]
+        return result
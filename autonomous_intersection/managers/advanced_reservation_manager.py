@@ -13,23 +13,26 @@ class AdvancedReservationBasedManager(IntersectionManager):
         super().__init__(width, height, road_width, parameters, model)
         self.reservations: Dict[frozenset, Optional[Car]] = self.create_turns()
         self.reservation_paths: Dict[Car, List[frozenset[Direction]]] = {}
-        self.debugs = []
+        intersection = self.intersection
+        for turn, corner in ((quarter(Direction.Left, Direction.Down), (intersection.left, intersection.top)),
+                             (quarter(Direction.Left, Direction.Up), (intersection.right, intersection.top)),
+                             (quarter(Direction.Right, Direction.Down), (intersection.left, intersection.bottom)),
+                             (quarter(Direction.Right, Direction.Up), (intersection.right, intersection.bottom))):
+            self.model.overlay.add(turn, Rect(*corner, 7, 7), "red")
 
     def control_cars(self):
         self.steps += 1
-        rects = {car.unique_id: car.rect() for car in self.cars.values()}
         self.clear_reservations()
 
-        new_rects = []
-        for car in self.cars.values():
-            rect = car.new_rect
+        collisions = self.collision_map()
+        for index, car in enumerate(collisions.cars):
+            rect = collisions.new_rects[index]
             # collisions
-            if any(rect in rects[other] for other in rects if car.unique_id != other) or any(
-                    rect in other for other in new_rects):
+            if collisions.collides(index):
                 car.stop()
             else:
                 # at intersection
-                if rect in self.intersection and car not in self.reservations.values():
+                if self.intersection.overlaps(rect, self.exact) and car not in self.reservations.values():
                     occupied = self.get_occupied_turns(car)
                     if all(self.reservations[turn] is None for turn in occupied):
                         # reserve lanes
@@ -37,32 +40,35 @@ class AdvancedReservationBasedManager(IntersectionManager):
                             self.reservations[turn] = car
                         self.reservation_paths[car] = occupied
                         self.agent_count += 1
+                        self.record_entry(car)
                         if self.first_step is None: self.first_step = self.steps
                     else:
                         car.stop()
                         continue
                 car.start()
-                new_rects.append(rect)
+                collisions.accept(index)
 
-        for debug in self.debugs:
-            self.model.delete_debug_object(debug)
-        self.debugs.clear()
-        for key, val in self.reservations.items():
-            if val is not None:
-                if key == {Direction.Left, Direction.Down}:
-                    self.debugs.append(
-                        self.model.draw_debug_object(Rect(self.intersection.left, self.intersection.top, 7, 7), "red"))
-                if key == {Direction.Left, Direction.Up}:
-                    self.debugs.append(
-                        self.model.draw_debug_object(Rect(self.intersection.right, self.intersection.top, 7, 7), "red"))
-                if key == {Direction.Right, Direction.Down}:
-                    self.debugs.append(
-                        self.model.draw_debug_object(Rect(self.intersection.left, self.intersection.bottom, 7, 7),
-                                                     "red"))
-                if key == {Direction.Right, Direction.Up}:
-                    self.debugs.append(
-                        self.model.draw_debug_object(Rect(self.intersection.right, self.intersection.bottom, 7, 7),
-                                                     "red"))
+        for turn, car in self.reservations.items():
+            self.model.overlay.show(turn, car is not None)
+
+    def get_state(self) -> dict:
+        return {**super().get_state(),
+                "reservations": {turn: None if car is None else car.unique_id
+                                 for turn, car in self.reservations.items()},
+                "reservation_paths": {car.unique_id: list(path) for car, path in self.reservation_paths.items()}}
+
+    def set_state(self, state: dict) -> None:
+        super().set_state(state)
+        self.reservations = {turn: None if car_id is None else self.cars[car_id]
+                             for turn, car_id in state["reservations"].items()}
+        self.reservation_paths = {self.cars[car_id]: list(path)
+                                  for car_id, path in state["reservation_paths"].items()}
+        for turn, car in self.reservations.items():
+            self.model.overlay.show(turn, car is not None)
+
+    def can_coast(self) -> bool:
+        return not self.reservation_paths and all(car is None for car in self.reservations.values()) and \
+            super().can_coast()
 
     def clear_reservations(self):
         to_del = []
@@ -72,7 +78,8 @@ class AdvancedReservationBasedManager(IntersectionManager):
                 continue
             n1, n2 = path[0]
             rect = car.rect()
-            if not (rect in self.lanes[n1].bounds and rect in self.lanes[n2].bounds):
+            if not (self.lanes[n1].bounds.overlaps(rect, self.exact) and
+                    self.lanes[n2].bounds.overlaps(rect, self.exact)):
                 self.reservations[path.pop(0)] = None
                 if not path:
                     to_del.append(car)
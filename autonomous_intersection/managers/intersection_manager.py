@@ -1,16 +1,24 @@
+import math
 from math import ceil
-from typing import Dict, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 
 import autonomous_intersection.model
 from autonomous_intersection.agents.car import Car
 from autonomous_intersection.agents.direction import Direction
+from autonomous_intersection.collision_map import CollisionMap, Group
 from autonomous_intersection.constants import PIXEL_PER_METER, STEPS_PER_SECOND
 from autonomous_intersection.intersection_builder import IntersectionBackgroundBuilder
 from autonomous_intersection.lane import Lane
+from autonomous_intersection.lane_index import LaneIndex
 from autonomous_intersection.rect import Rect
+from autonomous_intersection.trajectory_library import TrajectoryLibrary
 from autonomous_intersection.unit_translator import kmh_to_pixel_per_step
 
 
+EPSILON = 1e-9
+"""Margin of coast_steps against rounding errors"""
+
+
 def quarter(first: Direction, second: Direction):
     return frozenset({first, second})
 
@@ -28,12 +36,21 @@ class IntersectionManager:
                                                        STEPS_PER_SECOND) / STEPS_PER_SECOND)
         self.deceleration = self.default_velocity
 
+        self.exact = parameters.get("exact_collisions", False)
+        """Confirm overlaps of rotated rects with a separating axis test, see Rect.overlaps"""
         self.cars: Dict[int, Car] = {}
         self.intersection = self._get_intersection_rect()
         self.lanes: Dict[Direction, Lane] = self.create_lanes()
+        self.lane_index = LaneIndex(self.intersection, self.road_width / 2,
+                                    {direction: self.get_initial_car_position(direction) for direction in Direction},
+                                    self.exact)
+        self.trajectories = TrajectoryLibrary(parameters.get("trajectory_cache_size", 16384), self.exact)
+        self.closed_form_turns = parameters.get("closed_form_turns", False)
         self.agent_count = 0
         self.steps = 0
         self.first_step = None
+        self.prepared_collisions: Optional[CollisionMap] = None
+        """Collision map built beforehand for the next control_cars, see Ensemble"""
 
     def build_background(self):
         return IntersectionBackgroundBuilder.generate(self.width, self.height, self.road_width, self.road_width // 10,
@@ -62,17 +79,31 @@ class IntersectionManager:
         return Rect(self.width / 2 - self.road_width / 2, self.height / 2 - self.road_width / 2, self.road_width,
                     self.road_width, 0)
 
-    def create_new_car(self, initial_direction: Direction, car_size: Tuple[int, int], agent_id: int):
-        direction = self.model.random.choice([d for d in Direction if d != initial_direction.reverse])
-        car = Car(agent_id, self.model, self.lanes[initial_direction].line, self.lanes[direction].line,
-                  self.get_initial_car_position(initial_direction),
-                  car_size, initial_direction, direction,
-                  velocity=self.default_velocity,
-                  acceleration=self.acceleration,
-                  deceleration=self.deceleration)
+    def create_new_car(self, initial_direction: Direction, car_size: Tuple[int, int], agent_id: int,
+                       target: Optional[Direction] = None, color: Optional[str] = None):
+        """
+        :param target: exit direction, a random one except for the reverse of the entry when not given
+        """
+        if target is None:
+            target = self.model.random.choice([d for d in Direction if d != initial_direction.reverse])
+        car = self.build_car(agent_id, initial_direction, target, car_size, color)
         self.cars[agent_id] = car
+        self.lane_index.spawn(car)
         return car
 
+    def build_car(self, agent_id: int, initial_direction: Direction, target: Direction, car_size: Tuple[int, int],
+                  color: Optional[str] = None) -> Car:
+        return Car(agent_id, self.model, self.lanes[initial_direction].line, self.lanes[target].line,
+                   self.get_initial_car_position(initial_direction),
+                   car_size, initial_direction, target,
+                   color=color,
+                   velocity=self.default_velocity,
+                   acceleration=self.acceleration,
+                   deceleration=self.deceleration,
+                   trajectories=self.trajectories,
+                   closed_form_turns=self.closed_form_turns,
+                   fleet=self.model.fleet)
+
     def get_initial_car_position(self, direction: Direction) -> Tuple[int, int]:
         lane = self.lanes[direction]
         if direction == Direction.Up:
@@ -83,20 +114,26 @@ class IntersectionManager:
             return self.width - 1, round(lane.bounds.center[1])
         return 0, round(lane.bounds.center[1])
 
-    def is_entry_occupied(self, initial_direction: Direction):
+    def occupies_entry(self, car: Car, initial_direction: Direction) -> bool:
+        return self.entry_overlap(car, initial_direction) > 0
+
+    def entry_overlap(self, car: Car, initial_direction: Direction) -> float:
+        """
+        :return: distance the car still has to drive from the entry until it stops occupying it
+        """
         if initial_direction == Direction.Up:
-            return any(car for car in self.cars.values() if
-                       car.initial_direction == initial_direction and car.y > self.height - car.width * 3)
+            return car.y - (self.height - car.width * 3)
         elif initial_direction == Direction.Down:
-            return any(car for car in self.cars.values() if
-                       car.initial_direction == initial_direction and car.y < car.height * 3)
+            return car.height * 3 - car.y
         elif initial_direction == Direction.Right:
-            return any(car for car in self.cars.values() if
-                       car.initial_direction == initial_direction and car.x < car.width * 3)
+            return car.width * 3 - car.x
         elif initial_direction == Direction.Left:
-            return any(car for car in self.cars.values() if
-                       car.initial_direction == initial_direction and car.x > self.width - car.width * 3)
-        return True
+            return car.x - (self.width - car.width * 3)
+        return math.inf
+
+    def is_entry_occupied(self, initial_direction: Direction):
+        return any(self.occupies_entry(car, initial_direction) for car in
+                   self.lane_index.near_entry(initial_direction, 3 * self.lane_index.longest))
 
     def is_car_out_of_bounds(self, car: Car):
         if car.x + car.width < 0:
@@ -109,15 +146,141 @@ class IntersectionManager:
             return True
         return False
 
-    def remove_cars(self, space, schedule):
-        to_delete = set()
-        for car in filter(self.is_car_out_of_bounds, self.cars.values()):
+    def remove_cars(self, space, schedule) -> List[Car]:
+        self.lane_index.refresh()
+        to_delete = []
+        for car in self.lane_index.leaving(self.is_car_out_of_bounds):
             space.remove_agent(car)
             schedule.remove(car)
-            to_delete.add(car)
+            to_delete.append(car)
 
         for car in to_delete:
-            del self.cars[car.unique_id]
+            self.discard_car(car)
+        return to_delete
+
+    def discard_car(self, car: Car) -> None:
+        del self.cars[car.unique_id]
+        self.lane_index.remove(car)
+        if car.fleet is not None:
+            car.fleet.remove(car.state)
+        self.release_car(car)
+
+    def record_entry(self, car: Car) -> None:
+        if car.entry_step is None:
+            car.entry_step = self.model.schedule.steps
+
+    def release_car(self, car: Car) -> None:
+        """
+        Called when a car leaves the simulation
+        """
+        pass
+
+    @staticmethod
+    def car_record(car: Car) -> tuple:
+        """
+        :return: picklable data needed to rebuild the car with restore_car
+        """
+        return (car.unique_id, car.initial_direction, car.target, (car.width, car.height), car.color,
+                car.state.key(), list(car.route), car.spawn_step, car.entry_step, car.lost_time, car.stopped_steps,
+                car.stop_decisions)
+
+    def restore_car(self, record: tuple) -> Car:
+        agent_id, initial_direction, target, size, color, state, route, *metrics = record
+        car = self.build_car(agent_id, initial_direction, target, size, color)
+        car.state = Car.State(*state)
+        car.route = list(route)
+        car.spawn_step, car.entry_step, car.lost_time, car.stopped_steps, car.stop_decisions = metrics
+        self.cars[agent_id] = car
+        return car
+
+    def get_state(self) -> dict:
+        """
+        :return: picklable state of the manager without the cars, cars are referred to by their ids
+        """
+        return {"steps": self.steps, "first_step": self.first_step, "agent_count": self.agent_count,
+                "lane_index": self.lane_index.get_state()}
+
+    def set_state(self, state: dict) -> None:
+        """
+        Restores the state returned by get_state, cars have to be restored first
+        """
+        self.steps = state["steps"]
+        self.first_step = state["first_step"]
+        self.agent_count = state["agent_count"]
+        self.lane_index.set_state(state["lane_index"], self.cars)
+
+    def can_coast(self) -> bool:
+        """
+        :return: True if control_cars would not change any car in the next step, that is no car is crossing
+        or approaching the intersection closely and every car drives straight at full speed
+        """
+        if self.lane_index.crossing:
+            return False
+        for direction, queue in self.lane_index.approaches.items():
+            if queue and self.lane_index.distance_to_zone(queue[0], direction) <= \
+                    3 * queue[0].width + 2 * queue[0].state.velocity:
+                return False
+        for car in self.cars.values():
+            state = car.state
+            if state.velocity != car.max_velocity or state.target_velocity != car.max_velocity or state.delay or \
+                    state.rotation_speed:
+                return False
+        return True
+
+    def coast_steps(self) -> float:
+        """
+        Lower bound of the steps in which can_coast keeps holding and no car leaves, if can_coast holds now
+        and no car is added. The bound is conservative, rounding errors only shorten it.
+        :return: number of steps, infinite without any car
+        """
+        steps = math.inf
+        for direction, queue in self.lane_index.approaches.items():
+            if queue:
+                head = queue[0]
+                margin = self.lane_index.distance_to_zone(head, direction) - 3 * head.width - 2 * head.state.velocity
+                steps = min(steps, math.ceil(margin / head.state.velocity - EPSILON))
+        for car in self.cars.values():
+            state = car.state
+            for position, step, start, end in ((state.x, state.direction[0] * state.velocity, -car.width, self.width),
+                                               (state.y, state.direction[1] * state.velocity, -car.height,
+                                                self.height)):
+                # a car leaves in the step after the one that takes it past the border
+                if step > 0:
+                    steps = min(steps, math.floor((end - position) / step - EPSILON) + 1)
+                elif step < 0:
+                    steps = min(steps, math.floor((position - start) / -step - EPSILON) + 1)
+        return max(steps, 0)
+
+    def entry_occupied_steps(self, initial_direction: Direction) -> int:
+        """
+        :return: number of steps the entry stays occupied while the cars near it drive at full speed
+        """
+        steps = 0
+        for car in self.lane_index.near_entry(initial_direction, 3 * self.lane_index.longest):
+            overlap = self.entry_overlap(car, initial_direction)
+            if overlap > 0:
+                steps = max(steps, math.ceil(overlap / car.state.velocity))
+        return steps
+
+    def coast(self) -> None:
+        """
+        Advances the manager by a step in which can_coast held
+        """
+        self.steps += 1
+
+    def collision_group(self) -> Group:
+        """
+        :return: arguments of CollisionMap for the current cars
+        """
+        self.lane_index.refresh()
+        cars = list(self.cars.values())
+        return cars, self.lane_index.neighbour_indices(cars), self.lane_index.zone, self.exact
+
+    def collision_map(self) -> CollisionMap:
+        if self.prepared_collisions is not None:
+            collisions, self.prepared_collisions = self.prepared_collisions, None
+            return collisions
+        return CollisionMap(*self.collision_group())
 
     def control_cars(self):
         raise NotImplementedError()
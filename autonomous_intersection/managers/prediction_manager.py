@@ -1,77 +1,79 @@
-from typing import Dict
+from typing import List, Tuple
 
 import autonomous_intersection.model
 from autonomous_intersection.agents.car import Car
 from autonomous_intersection.managers.intersection_manager import IntersectionManager
 from autonomous_intersection.rect import Rect
+from autonomous_intersection.reservation_table import ReservationTable
 
 
 class PredictionBasedManager(IntersectionManager):
     def __init__(self, width: int, height: int, road_width: int, parameters: dict,
                  model: "autonomous_intersection.model.Intersection"):
         super().__init__(width, height, road_width, parameters, model)
-        self.reservations: Dict[Car, Dict[int, Rect]] = {}
+        self.reservations = ReservationTable(self.lane_index.zone, parameters.get("tile_size", 2), self.exact)
 
-    def reserve(self, car: Car):
-        state = car.state
-        step = self.steps
-        self.reservations[car] = {}
-        visited = False
-        while not visited or car.rect(state) in self.intersection:
-            state = car.simulate(state, 1)
-            self.reservations[car][step] = car.rect(state)
-            step += 1
-            if not visited and car.rect(state) in self.intersection:
-                visited = True
+    def footprint(self, car: Car) -> List[Tuple[int, int, Rect]]:
+        """
+        :return: tiles and rect of the car at every step until it leaves the intersection
+        """
+        return [(step, self.reservations.mask(rect), rect) for step, rect in
+                enumerate(self.trajectories.crossing(car, self.intersection), self.steps)]
 
-    def can_reserve(self, car: Car) -> bool:
-        state = car.state
-        step = self.steps
-        visited = False
-        while not visited or car.rect(state) in self.intersection:
-            state = car.simulate(state, 1)
-            rect = car.rect(state)
-            if not visited and rect in self.intersection:
-                visited = True
-            for reservation in self.reservations.values():
-                if (step in reservation and reservation[step] in rect) or (
-                        step - 1 in reservation and reservation[step - 1] in rect):
-                    return False
-            step += 1
+    def reserve(self, car: Car, footprint: List[Tuple[int, int, Rect]]):
+        self.reservations.reserve(car, footprint)
 
-        return True
+    def can_reserve(self, footprint: List[Tuple[int, int, Rect]]) -> bool:
+        return all(self.reservations.is_free(step, mask, rect) and self.reservations.is_free(step - 1, mask, rect)
+                   for step, mask, rect in footprint)
 
     def control_cars(self):
         self.steps += 1
-        rects = {car.unique_id: car.rect() for car in self.cars.values()}
         self.clear_reservations()
 
-        new_rects = []
-        for car in self.cars.values():
-            rect = car.new_rect
+        collisions = self.collision_map()
+        for index, car in enumerate(collisions.cars):
+            rect = collisions.new_rects[index]
             # collisions
             reserved = car in self.reservations
-            if not reserved and (any(rect in rects[other] for other in rects if car.unique_id != other) or any(
-                    rect in other for other in new_rects)):
+            if not reserved and collisions.collides(index):
                 car.stop()
             else:
                 # at intersection
-                if not reserved and rect in self.intersection:
-                    if self.can_reserve(car):
+                if not reserved and self.intersection.overlaps(rect, self.exact):
+                    footprint = self.footprint(car)
+                    if self.can_reserve(footprint):
                         # reserve lanes
-                        self.reserve(car)
+                        self.reserve(car, footprint)
                         self.agent_count += 1
+                        self.record_entry(car)
                         if self.first_step is None: self.first_step = self.steps
                     else:
                         car.stop()
                         continue
                 car.start()
-                new_rects.append(rect)
+                collisions.accept(index)
+
+    def can_coast(self) -> bool:
+        return not len(self.reservations) and super().can_coast()
+
+    def coast(self) -> None:
+        super().coast()
+        self.clear_reservations()
 
     def clear_reservations(self):
-        to_del = set()
-        for car, reservations in self.reservations.items():
-            if not reservations:
-                to_del.add(car)
-        for car in to_del:
-            del self.reservations[car]
+        self.reservations.advance(self.steps - 1)
+
+    def release_car(self, car: Car) -> None:
+        self.reservations.release(car)
+
+    def get_state(self) -> dict:
+        return {**super().get_state(), "reservations": self.reservations.get_state()}
+
+    def set_state(self, state: dict) -> None:
+        super().set_state(state)
+        self.reservations.set_state(state["reservations"], self.cars)
+
+    @property
+    def reservation_footprint(self) -> int:
+        return self.reservations.size
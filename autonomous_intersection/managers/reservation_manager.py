@@ -14,37 +14,49 @@ class ReservationBasedManager(IntersectionManager):
 
     def control_cars(self):
         self.steps += 1
-        rects = {car.unique_id: car.rect() for car in self.cars.values()}
         self.clear_reservations()
 
-        new_rects = []
-        for car in self.cars.values():
-            rect = car.new_rect
+        collisions = self.collision_map()
+        for index, car in enumerate(collisions.cars):
+            rect = collisions.new_rects[index]
             # collisions
-            if any(rect in rects[other] for other in rects if car.unique_id != other) or any(
-                    rect in other for other in new_rects):
+            if collisions.collides(index):
                 car.stop()
             else:
                 # at intersection
-                if rect in self.intersection and car not in self.reservations.values():
+                if self.intersection.overlaps(rect, self.exact) and car not in self.reservations.values():
                     occupied = self.get_occupied_turns(car)
                     if all(self.reservations[turn] is None for turn in occupied):
                         # reserve lanes
                         for turn in occupied:
                             self.reservations[turn] = car
                         self.agent_count += 1
+                        self.record_entry(car)
                         if self.first_step is None: self.first_step = self.steps
                     else:
                         car.stop()
                         continue
                 car.start()
-                new_rects.append(rect)
+                collisions.accept(index)
+
+    def get_state(self) -> dict:
+        return {**super().get_state(),
+                "reservations": {turn: None if car is None else car.unique_id
+                                 for turn, car in self.reservations.items()}}
+
+    def set_state(self, state: dict) -> None:
+        super().set_state(state)
+        self.reservations = {turn: None if car_id is None else self.cars[car_id]
+                             for turn, car_id in state["reservations"].items()}
+
+    def can_coast(self) -> bool:
+        return all(car is None for car in self.reservations.values()) and super().can_coast()
 
     def clear_reservations(self):
         for key in self.reservations:
             if self.reservations[key] is not None:
                 rect = self.reservations[key].rect()
-                if rect not in self.intersection:
+                if not self.intersection.overlaps(rect, self.exact):
                     self.reservations[key] = None
 
     @staticmethod
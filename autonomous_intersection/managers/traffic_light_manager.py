@@ -14,20 +14,43 @@ class TrafficLightManager(IntersectionManager):
         self.current_light: Optional[Direction] = Direction.Right
         self.next_light: Optional[Direction] = None
         self.change_time = STEPS_PER_SECOND * 10
-        self.indicator = self.model.draw_debug_object(self.lanes[self.current_light].line.bounds, "green")
+        for direction in Direction:
+            self.model.overlay.add(direction, self.lanes[direction].line.bounds, "green")
+        self.model.overlay.show(self.current_light)
         self.agents = set()
 
     def change_lights(self) -> None:
         if self.current_light is None and self.change_time == self.steps:
             self.change_time += STEPS_PER_SECOND * 10
             self.current_light = self.next_light
-            self.indicator = self.model.draw_debug_object(self.lanes[self.current_light].line.bounds, "green")
+            self.model.overlay.show(self.current_light)
         elif self.current_light is not None and self.change_time == self.steps:
             self.change_time += STEPS_PER_SECOND * 2
             self.next_light = self.current_light.turned(Steer.Left)
+            self.model.overlay.hide(self.current_light)
             self.current_light = None
-            self.model.delete_debug_object(self.indicator)
-            self.indicator = None
+
+    def get_state(self) -> dict:
+        return {**super().get_state(), "current_light": self.current_light, "next_light": self.next_light,
+                "change_time": self.change_time, "agents": set(self.agents)}
+
+    def set_state(self, state: dict) -> None:
+        super().set_state(state)
+        self.current_light = state["current_light"]
+        self.next_light = state["next_light"]
+        self.change_time = state["change_time"]
+        self.agents = set(state["agents"])
+        for direction in Direction:
+            self.model.overlay.show(direction, direction == self.current_light)
+
+    def can_coast(self) -> bool:
+        return self.change_time != self.steps and super().can_coast()
+
+    def coast_steps(self) -> float:
+        steps = super().coast_steps()
+        if self.change_time > self.steps:
+            steps = min(steps, self.change_time - self.steps)
+        return steps
 
     def can_turn(self, car: Car) -> bool:
         return self.current_light and (self.current_light == car.initial_direction or (
@@ -35,31 +58,30 @@ class TrafficLightManager(IntersectionManager):
 
     def control_cars(self) -> None:
         self.change_lights()
-        rects = {car.unique_id: car.rect() for car in self.cars.values()}
 
-        new_rects = []
-        for car in self.cars.values():
-            rect = car.new_rect
+        collisions = self.collision_map()
+        for index, car in enumerate(collisions.cars):
+            rect = collisions.new_rects[index]
             # collisions
-            if any(rect in rects[other] for other in rects if car.unique_id != other) or any(
-                    rect in other for other in new_rects):
+            if collisions.collides(index):
                 car.stop()
             else:
                 # at intersection
-                if rect in self.intersection:
+                if self.intersection.overlaps(rect, self.exact):
                     self.agents.add(car.unique_id)
+                    self.record_entry(car)
                     if self.first_step is None:
                         self.first_step = self.steps
                     if self.can_turn(car):
                         car.start(STEPS_PER_SECOND)
                     else:
-                        if car.rect() in self.intersection:
+                        if self.intersection.overlaps(car.rect(), self.exact):
                             car.start()
                         else:
                             car.stop()
                 else:
                     car.start(STEPS_PER_SECOND // 2)
-                new_rects.append(rect)
+                collisions.accept(index)
 
         self.steps += 1
         self.agent_count = len(self.agents)
@@ -0,0 +1,134 @@
+import glob
+import os
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import autonomous_intersection.model
+from autonomous_intersection.agents.car import Car
+from autonomous_intersection.agents.direction import Direction
+
+CAR_COLUMNS = ("id", "entry", "target", "spawn_step", "entry_step", "exit_step", "delay", "stopped_steps",
+               "stop_decisions")
+DIRECTIONS = list(Direction)
+
+
+def write_chunk(path: str, columns: Dict[str, list]) -> None:
+    """
+    Stores every column as a separate array, column names are kept in order in the names array
+    """
+    names = list(columns)
+    arrays = {F"column_{index}": np.asarray(columns[name]) for index, name in enumerate(names)}
+    np.savez(path, names=np.array(names), **arrays)
+
+
+def read_metrics(directory: str, kind: str = "steps") -> Dict[str, np.ndarray]:
+    """
+    :param kind: "steps" or "cars"
+    :return: columns of all chunks of the given kind concatenated
+    """
+    result: Dict[str, List[np.ndarray]] = {}
+    for path in sorted(glob.glob(os.path.join(directory, F"{kind}-*.npz"))):
+        with np.load(path) as chunk:
+            for index, name in enumerate(chunk["names"]):
+                result.setdefault(str(name), []).append(chunk[F"column_{index}"])
+    return {name: np.concatenate(arrays) for name, arrays in result.items()}
+
+
+class MetricsCollector:
+    """
+    Per step model metrics and per car records with bounded memory.
+    Recent step records are kept in a ring buffer. With an output directory, all records are also written
+    in fixed size columnar chunks (steps-NNNNNN.npz and cars-NNNNNN.npz, see read_metrics).
+    Delay of a car is the number of steps lost against driving at its maximum velocity the whole time,
+    it is tracked only with tracking on.
+    """
+
+    def __init__(self, model_reporters: Dict[str, Callable[["autonomous_intersection.model.Intersection"], float]],
+                 output_dir: Optional[str] = None, interval: int = 1, chunk_size: int = 4096,
+                 buffer_size: int = 1024, tracking: bool = True):
+        self.model_reporters = model_reporters
+        self.output_dir = output_dir
+        self.tracking = tracking
+        self.interval = max(1, interval)
+        self.chunk_size = chunk_size
+        self.recent: Deque[Tuple[int, Dict[str, float]]] = deque(maxlen=buffer_size)
+        self.step_rows: Dict[str, list] = self._empty(("step", *model_reporters))
+        self.car_rows: Dict[str, list] = self._empty(CAR_COLUMNS)
+        self.chunks = {"steps": 0, "cars": 0}
+        self.steps = 0
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+
+    @staticmethod
+    def _empty(columns: Iterable[str]) -> Dict[str, list]:
+        return {column: [] for column in columns}
+
+    def collect(self, model: "autonomous_intersection.model.Intersection", track: bool = True) -> None:
+        """
+        :param track: False in steps in which every car drives at full speed and loses no time
+        """
+        self.steps += 1
+        if track and self.tracking:
+            self.track_cars(model.manager.cars.values())
+        if self.steps % self.interval:
+            return
+        values = {name: reporter(model) for name, reporter in self.model_reporters.items()}
+        self.recent.append((self.steps, values))
+        if self.output_dir is None:
+            return
+        self.step_rows["step"].append(self.steps)
+        for name, value in values.items():
+            self.step_rows[name].append(value)
+        if len(self.step_rows["step"]) >= self.chunk_size:
+            self._flush("steps", self.step_rows)
+
+    @staticmethod
+    def track_cars(cars: Iterable[Car]) -> None:
+        for car in cars:
+            velocity = car.state.velocity
+            car.lost_time += 1 - velocity / car.max_velocity
+            if velocity == 0:
+                car.stopped_steps += 1
+
+    def record_cars(self, cars: Iterable[Car], step: int) -> None:
+        """
+        Stores records of cars that left the model
+        """
+        if self.output_dir is None:
+            return
+        for car in cars:
+            row = (car.unique_id, DIRECTIONS.index(car.initial_direction), DIRECTIONS.index(car.target),
+                   car.spawn_step, -1 if car.entry_step is None else car.entry_step, step, car.lost_time,
+                   car.stopped_steps, car.stop_decisions)
+            for column, value in zip(CAR_COLUMNS, row):
+                self.car_rows[column].append(value)
+        if len(self.car_rows["id"]) >= self.chunk_size:
+            self._flush("cars", self.car_rows)
+
+    def _flush(self, kind: str, rows: Dict[str, list]) -> None:
+        if not next(iter(rows.values())):
+            return
+        write_chunk(os.path.join(self.output_dir, F"{kind}-{self.chunks[kind]:06d}.npz"), rows)
+        self.chunks[kind] += 1
+        for column in rows.values():
+            column.clear()
+
+    def flush(self, cars: Iterable[Car] = ()) -> None:
+        """
+        Writes partially filled chunks, Intersection.close calls it when the run ends
+        :param cars: cars still in the model, they are recorded with exit_step -1
+        """
+        if self.output_dir is None:
+            return
+        self.record_cars(cars, -1)
+        self._flush("steps", self.step_rows)
+        self._flush("cars", self.car_rows)
+
+    def get_model_vars_dataframe(self):
+        """
+        :return: data frame of the step records still held in the ring buffer
+        """
+        import pandas
+        return pandas.DataFrame([values for _, values in self.recent], index=[step for step, _ in self.recent])
@@ -1,19 +1,40 @@
+import importlib
+import pickle
+import random
+import weakref
+import zlib
+from collections import deque
 from enum import Enum, auto
-from typing import Any, Tuple
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import numpy as np
 from mesa import Model
-from mesa.datacollection import DataCollector
 from mesa.space import ContinuousSpace
 from mesa.time import SimultaneousActivation
 
+from autonomous_intersection.agents.car import Car
 from autonomous_intersection.agents.direction import Direction
 from autonomous_intersection.agents.visualcell import VisualCell
 from autonomous_intersection.constants import PIXEL_PER_METER, STEPS_PER_SECOND
-from autonomous_intersection.managers.advanced_reservation_manager import AdvancedReservationBasedManager
-from autonomous_intersection.managers.prediction_manager import PredictionBasedManager
-from autonomous_intersection.managers.reservation_manager import ReservationBasedManager
-from autonomous_intersection.managers.traffic_light_manager import TrafficLightManager
-from autonomous_intersection.rect import Rect
+from autonomous_intersection.overlay import OverlayLayer
+
+# annotations only, optional features are imported when a model uses them
+if TYPE_CHECKING:
+    import autonomous_intersection.collision_map
+    import autonomous_intersection.metrics
+    import autonomous_intersection.network
+    import autonomous_intersection.recording
+
+
+def _repeated_sum(start: np.ndarray, increments: np.ndarray, steps: int) -> np.ndarray:
+    """
+    :return: start + increments added steps times, rounded after every addition
+    """
+    terms = np.empty((len(start), steps + 1))
+    terms[:, 0] = start
+    terms[:, 1:] = increments[:, None]
+    # accumulate adds sequentially, unlike sum
+    return np.add.accumulate(terms, axis=1)[:, -1]
 
 
 class Manager(Enum):
@@ -23,68 +44,348 @@ class Manager(Enum):
     Prediction = auto()
 
 
+MANAGER_CLASSES = {
+    Manager.TrafficLight.name: ("autonomous_intersection.managers.traffic_light_manager", "TrafficLightManager"),
+    Manager.BasicReservation.name: ("autonomous_intersection.managers.reservation_manager",
+                                    "ReservationBasedManager"),
+    Manager.AdvancedReservation.name: ("autonomous_intersection.managers.advanced_reservation_manager",
+                                       "AdvancedReservationBasedManager"),
+    Manager.Prediction.name: ("autonomous_intersection.managers.prediction_manager", "PredictionBasedManager"),
+}
+"""Managers are imported on first use, so that only the selected one is loaded"""
+
+
+def _flush_outputs(collector: "autonomous_intersection.metrics.MetricsCollector",
+                   recorder: Optional["autonomous_intersection.recording.Recorder"], cars: Iterable[Car] = ()) -> None:
+    collector.flush(cars)
+    if recorder is not None:
+        recorder.flush()
+
+
 class Intersection(Model):
     def __init__(self, height=1000, width=1000, spawn_rate=10, manager: str = Manager.TrafficLight.name, *args: Any,
                  **parameters: Any):
         super().__init__(*args, **parameters)
+        # Mesa keeps the generator on the class, every model gets its own so that several can run side by side
+        self.random = random.Random(parameters.get("seed"))
         self.schedule = SimultaneousActivation(self)
         self.space = ContinuousSpace(height, width, False)
         self.width = width
         self.height = height
         self.road_width = 7 * PIXEL_PER_METER
+        fleet = parameters.get("fleet", False)
+        self.fleet = None
+        self.owns_fleet = True
+        if fleet is not None and fleet is not False:
+            from autonomous_intersection.agents.fleet import CarFleet
+            # a fleet passed in is shared with other models and stepped by its owner, an empty one is false,
+            # any other true value asks for an own fleet
+            if isinstance(fleet, CarFleet):
+                self.fleet, self.owns_fleet = fleet, False
+            elif fleet:
+                self.fleet = CarFleet()
+        self.overlay = OverlayLayer(self, not parameters.get("headless", False))
         self.manager = self.get_manager(manager)(self.width, self.height, self.road_width, parameters, self)
         self.build_background()
         self.agent_id = 0
+        self.agent_ids: Optional[Iterator[int]] = parameters.get("agent_ids")
+        self.spawn_entries = {Direction[name] for name in parameters.get("spawn_entries", Direction.__members__)}
+        self.route_planner: Optional[Callable[["Intersection", Car], List[Direction]]] = \
+            parameters.get("route_planner")
+        self.arrivals: Dict[Direction, Deque["autonomous_intersection.network.Handoff"]] = \
+            {direction: deque() for direction in Direction}
+        self.departures: List[Car] = []
         self.running = True
         self.spawn_rate = spawn_rate / 100
         self.car_height = int(1.5 * PIXEL_PER_METER)
-        self.data_collector = DataCollector(model_reporters={"Throughput [cars / min]": self.get_agent_rate})
+        self.fast_forward = parameters.get("fast_forward", False) and self.owns_fleet
+        self.coasted_steps = 0
+        from autonomous_intersection.metrics import MetricsCollector
+        from autonomous_intersection.profiler import Profiler
+        self.profiler = Profiler(parameters.get("profile", False), parameters.get("profile_calls", True))
+        reporters = {"Throughput [cars / min]": Intersection.get_agent_rate}
+        for direction in Direction:
+            reporters[F"Queue {direction.name} [cars]"] = \
+                lambda model, direction=direction: model.manager.lane_index.queue_length(direction)
+        if self.profiler.enabled:
+            reporters.update(self.profiler.reporters())
+        # delays of cars are tracked when they are written or asked for
+        self.data_collector = MetricsCollector(reporters, parameters.get("metrics_dir"),
+                                               parameters.get("metrics_interval", 1),
+                                               parameters.get("metrics_chunk_size", 4096),
+                                               parameters.get("metrics_buffer_size", 1024),
+                                               parameters.get("track_cars", parameters.get("metrics_dir") is not None))
+        record_dir = parameters.get("record_dir")
+        self.recorder = None
+        if record_dir is not None:
+            from autonomous_intersection.recording import Recorder
+            self.recorder = Recorder(record_dir, self, parameters.get("record_chunk_size", 256))
+        # buffered output of a model that is never closed is written when it is collected or at exit,
+        # without the cars still driving
+        self._flush_outputs = weakref.finalize(self, _flush_outputs, self.data_collector, self.recorder)
 
     @staticmethod
     def get_manager(manager):
-        if manager == Manager.TrafficLight.name: return TrafficLightManager
-        if manager == Manager.BasicReservation.name: return ReservationBasedManager
-        if manager == Manager.AdvancedReservation.name: return AdvancedReservationBasedManager
-        return PredictionBasedManager
+        module, name = MANAGER_CLASSES.get(manager, MANAGER_CLASSES[Manager.Prediction.name])
+        return getattr(importlib.import_module(module), name)
 
     def get_agent_id(self):
+        if self.agent_ids is not None:
+            return next(self.agent_ids)
         self.agent_id += 1
         return self.agent_id
 
     def build_background(self):
-        for cell in self.manager.build_background():
-            self.space.place_agent(cell, (cell.x, cell.y))
-            self.schedule.add(cell)
+        """
+        Background cells are static, they are kept out of the schedule and the space and drawn once by the canvas
+        """
+        self.background: List[VisualCell] = list(self.manager.build_background())
 
     def spawn_car(self, entry, width, height):
         cell = self.manager.create_new_car(entry, (width, height), self.get_agent_id())
+        cell.spawn_step = self.schedule.steps
+        if self.route_planner is not None:
+            cell.route = self.route_planner(self, cell)
         self.space.place_agent(cell, (cell.x, cell.y))
         self.schedule.add(cell)
 
+    def admit_car(self, handoff: "autonomous_intersection.network.Handoff") -> Car:
+        """
+        Continues the route of a car that left a neighbouring intersection
+        """
+        cell = self.manager.create_new_car(handoff.entry, handoff.size, handoff.agent_id, handoff.route[0],
+                                           handoff.color)
+        cell.route = list(handoff.route[1:])
+        cell.spawn_step, cell.lost_time = handoff.spawn_step, handoff.lost_time
+        cell.stopped_steps, cell.stop_decisions = handoff.stopped_steps, handoff.stop_decisions
+        self.space.place_agent(cell, (cell.x, cell.y))
+        self.schedule.add(cell)
+        return cell
+
     def add_new_agents(self):
         for entry in Direction:
-            if not self.manager.is_entry_occupied(entry) and self.random.random() < self.spawn_rate:
+            if self.arrivals[entry]:
+                if not self.manager.is_entry_occupied(entry):
+                    self.admit_car(self.arrivals[entry].popleft())
+            elif entry in self.spawn_entries and not self.manager.is_entry_occupied(entry) and \
+                    self.random.random() < self.spawn_rate:
                 self.spawn_car(entry, *self.random_car_size(self.car_height))
 
     def random_car_size(self, height) -> Tuple[int, int]:
         return self.random.randint(round(height * 1.3), height * 2), height
 
     def step(self):
+        self.profiler.start_step()
+        if self.fast_forward and self.manager.can_coast():
+            with self.profiler.phase("coast"):
+                self.coast()
+            return
+        self.control()
+        if self.fleet is not None and self.owns_fleet:
+            with self.profiler.phase("fleet"):
+                self.fleet.step()
+        self.finish_step()
+
+    def advance(self, limit: int) -> int:
+        """
+        Runs at least one and at most limit steps, with fast forward free flow until the next event is skipped
+        in one jump. The events are spawns, a car coming close to the intersection or leaving and light changes.
+        :param limit: maximum number of steps
+        :return: number of steps run
+        """
+        if self.fast_forward and limit > 1 and self.recorder is None and self.manager.can_coast():
+            steps = self.coast_steps(limit)
+            if steps:
+                self.profiler.start_step()
+                with self.profiler.phase("coast"):
+                    self.jump(steps)
+                return steps
+        self.step()
+        return 1
+
+    def coast_steps(self, limit: int) -> int:
+        """
+        Draws the spawn decisions of the following steps, the generator is left as it was before the first spawn
+        :return: number of steps until the next event, at most limit
+        """
+        if any(self.arrivals.values()):
+            return 0
+        steps = min(limit, self.manager.coast_steps())
+        free = []
+        for entry in Direction:
+            if entry in self.spawn_entries:
+                occupied = self.manager.entry_occupied_steps(entry)
+                if occupied:
+                    steps = min(steps, occupied)
+                else:
+                    free.append(entry)
+        if not free:
+            return steps
+        state = self.random.getstate()
+        for step in range(steps):
+            for _ in free:
+                if self.random.random() < self.spawn_rate:
+                    # the spawning step runs regularly and draws again
+                    self.random.setstate(state)
+                    for _ in range(step * len(free)):
+                        self.random.random()
+                    return step
+        return steps
+
+    def jump(self, steps: int) -> None:
+        """
+        Runs the given number of steps in which can_coast holds and nothing is spawned or removed,
+        cars are moved straight in one update with the same rounding as step by step
+        """
+        self.departures = []
+        if self.fleet is not None:
+            rows = np.flatnonzero(self.fleet.active[:self.fleet.size])
+            velocity = self.fleet.velocity[rows]
+            for position, direction in ((self.fleet.x, self.fleet.dx), (self.fleet.y, self.fleet.dy)):
+                position[rows] = _repeated_sum(position[rows], direction[rows] * velocity, steps)
+        else:
+            cars = list(self.manager.cars.values())
+            for axis in (0, 1):
+                positions = [(car.state.x, car.state.y)[axis] for car in cars]
+                increments = [car.state.direction[axis] * car.state.velocity for car in cars]
+                moved = _repeated_sum(np.array(positions, dtype=float), np.array(increments, dtype=float), steps)
+                for car, position, increment, value in zip(cars, positions, increments, moved.tolist()):
+                    # integer positions stay integers as with +=
+                    if isinstance(position, int) and isinstance(increment, int):
+                        value = position + steps * increment
+                    if axis:
+                        car.state.y = value
+                    else:
+                        car.state.x = value
+        for _ in range(steps):
+            self.manager.coast()
+            self.schedule.steps += 1
+            self.schedule.time += 1
+            self.data_collector.collect(self, track=False)
+        self.coasted_steps += steps
+
+    def control(self) -> None:
+        """
+        First part of a step, spawns and removes cars and lets the manager decide
+        """
+        self.update_cars()
+        self.control_cars()
+
+    def update_cars(self) -> None:
+        with self.profiler.phase("add_new_agents"):
+            self.add_new_agents()
+        with self.profiler.phase("remove_cars"):
+            self.departures = self.manager.remove_cars(self.space, self.schedule)
+            self.data_collector.record_cars(self.departures, self.schedule.steps)
+
+    def control_cars(self, collisions: Optional["autonomous_intersection.collision_map.CollisionMap"] = None) -> None:
+        """
+        :param collisions: collision map of the cars after update_cars built by the caller,
+        the manager builds it otherwise
+        """
+        with self.profiler.phase("control_cars"):
+            self.manager.prepared_collisions = collisions
+            self.manager.control_cars()
+
+    def finish_step(self) -> None:
+        """
+        Second part of a step, moves cars not stored in a fleet and collects metrics
+        """
+        with self.profiler.phase("schedule"):
+            self.schedule.step()
+        with self.profiler.phase("collect"):
+            self.data_collector.collect(self)
+            if self.recorder is not None:
+                self.recorder.record(self)
+
+    def coast(self) -> None:
+        """
+        Step in free flow, control decisions are skipped and cars are moved straight.
+        Spawning, removal and metrics are the same as in a regular step, so the random generator
+        and the results stay the same as without fast forward.
+        """
         self.add_new_agents()
-        self.manager.remove_cars(self.space, self.schedule)
-        self.manager.control_cars()
-        self.schedule.step()
+        self.departures = self.manager.remove_cars(self.space, self.schedule)
+        self.data_collector.record_cars(self.departures, self.schedule.steps)
+        self.manager.coast()
+        if self.fleet is not None:
+            self.fleet.step()
+        else:
+            for car in self.manager.cars.values():
+                state = car.state
+                state.x += state.direction[0] * state.velocity
+                state.y += state.direction[1] * state.velocity
+        self.schedule.steps += 1
+        self.schedule.time += 1
+        self.coasted_steps += 1
         self.data_collector.collect(self)
+        if self.recorder is not None:
+            self.recorder.record(self)
 
-    def draw_debug_object(self, rect: Rect, color: str) -> VisualCell:
-        cell = VisualCell((rect.left, rect.top), (rect.width, rect.height), self, color, 2)
-        self.space.place_agent(cell, (cell.x, cell.y))
-        self.schedule.add(cell)
-        return cell
+    def snapshot(self) -> bytes:
+        """
+        Captures the random generator, cars, manager and step counters, the background and parameters are not
+        included, so a snapshot can only be restored into a model created with the same parameters
+        :return: compressed binary blob
+        """
+        state = {
+            "random": self.random.getstate(),
+            "agent_id": self.agent_id,
+            "running": self.running,
+            "schedule": (self.schedule.steps, self.schedule.time),
+            "collector_steps": self.data_collector.steps,
+            "cars": [self.manager.car_record(car) for car in self.manager.cars.values()],
+            "manager": self.manager.get_state(),
+        }
+        return zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+
+    def restore(self, snapshot: bytes) -> None:
+        """
+        Replaces the state of the model with the one captured by snapshot, snapshots are unpickled,
+        so they must come from a trusted source
+        """
+        state = pickle.loads(zlib.decompress(snapshot))
+        for car in list(self.manager.cars.values()):
+            self.space.remove_agent(car)
+            self.schedule.remove(car)
+            self.manager.discard_car(car)
+        for record in state["cars"]:
+            car = self.manager.restore_car(record)
+            self.space.place_agent(car, self.clamp_to_space(car.x, car.y))
+            self.schedule.add(car)
+        self.manager.set_state(state["manager"])
+        self.random.setstate(state["random"])
+        self.agent_id = state["agent_id"]
+        self.running = state["running"]
+        self.schedule.steps, self.schedule.time = state["schedule"]
+        self.data_collector.steps = state["collector_steps"]
+        if self.recorder is not None:
+            self.recorder.rewind(self.schedule.steps)
+
+    def close(self) -> None:
+        """
+        Ends the run, writes the metrics and recorded steps still buffered together with the cars still driving
+        and stops counting calls
+        """
+        if self._flush_outputs.detach() is not None:
+            _flush_outputs(self.data_collector, self.recorder, self.manager.cars.values())
+        self.profiler.close()
+
+    def clamp_to_space(self, x: float, y: float) -> Tuple[float, float]:
+        """
+        Cars are placed in the space once and moved by their state only, so a restored car may already be
+        past the edge of the space
+        :return: the nearest point inside the space
+        """
+        space = self.space
+        return min(max(x, space.x_min), space.x_max - 1), min(max(y, space.y_min), space.y_max - 1)
 
-    def delete_debug_object(self, cell: VisualCell) -> None:
-        self.space.remove_agent(cell)
-        self.schedule.remove(cell)
+    def profile_report(self) -> dict:
+        """
+        :return: time spent in every phase of step and call counts of Rect.overlaps and Car.simulate,
+        empty unless the model was created with profile=True
+        """
+        return self.profiler.report() if self.profiler.enabled else {}
 
     def get_agent_rate(self):
         if self.manager.first_step is None: return 0
@@ -0,0 +1,137 @@
+import itertools
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from mesa import Model
+
+import autonomous_intersection.model
+from autonomous_intersection.agents.car import Car
+from autonomous_intersection.agents.direction import Direction
+
+Position = Tuple[int, int]
+
+
+class Handoff(NamedTuple):
+    """
+    Car that left an intersection, entry is the direction it drives in when it enters the next one
+    """
+    agent_id: int
+    entry: Direction
+    size: Tuple[int, int]
+    color: str
+    route: Tuple[Direction, ...]
+    spawn_step: int
+    lost_time: float
+    stopped_steps: int
+    stop_decisions: int
+
+    @staticmethod
+    def of(car: Car) -> "Handoff":
+        return Handoff(car.unique_id, car.target, (car.width, car.height), car.color, tuple(car.route),
+                       car.spawn_step, car.lost_time, car.stopped_steps, car.stop_decisions)
+
+
+class IntersectionNetwork(Model):
+    """
+    Grid of intersections, each one a separate Intersection model with its own manager and random generator.
+    New cars enter only at the border of the grid. A car that leaves an intersection towards a neighbour
+    waits at the entry of that neighbour until it is free, so every manager controls only its own cars.
+    Routes are planned when a car enters the network, they go straight after max_turns intersections.
+    Each intersection draws car ids from its own sequence, so a network can be split into parts
+    (positions) that are stepped separately with the same result.
+    """
+
+    def __init__(self, rows: int = 2, columns: int = 2, height: int = 1000, width: int = 1000, spawn_rate: int = 10,
+                 manager: str = "TrafficLight", seed: Optional[int] = None, max_turns: int = 4,
+                 positions: Optional[Iterable[Position]] = None, **parameters: Any):
+        super().__init__(seed=seed)
+        self.rows = rows
+        self.columns = columns
+        self.max_turns = max_turns
+        self.nodes: Dict[Position, "autonomous_intersection.model.Intersection"] = {}
+        count = rows * columns
+        for row, column in positions if positions is not None else itertools.product(range(rows), range(columns)):
+            index = row * columns + column
+            entries = [direction.name for direction in Direction
+                       if self.neighbour((row, column), direction.reverse) is None]
+            self.nodes[(row, column)] = autonomous_intersection.model.Intersection(
+                height, width, spawn_rate, manager,
+                seed=None if seed is None else seed + index,
+                spawn_entries=entries,
+                agent_ids=itertools.count(index + 1, count),
+                route_planner=partial(self.plan_route, (row, column)),
+                # cars that leave the network carry their delays
+                **{"track_cars": True, **parameters})
+        self.exited: List[Handoff] = []
+        self.outgoing: List[Tuple[Position, Handoff]] = []
+        """Cars headed to intersections of other parts of the network"""
+        self.running = True
+
+    def neighbour(self, position: Position, direction: Direction) -> Optional[Position]:
+        """
+        :return: position of the intersection the direction leads to, None at the border
+        """
+        dx, dy = direction.velocity
+        row, column = position[0] + dy, position[1] + dx
+        if 0 <= row < self.rows and 0 <= column < self.columns:
+            return row, column
+        return None
+
+    def plan_route(self, position: Position, model: "autonomous_intersection.model.Intersection",
+                   car: Car) -> List[Direction]:
+        """
+        :return: targets of the car at every following intersection until it leaves the grid
+        """
+        route = []
+        heading = car.target
+        position = self.neighbour(position, heading)
+        while position is not None:
+            if len(route) < self.max_turns:
+                heading = model.random.choice([d for d in Direction if d != heading.reverse])
+            route.append(heading)
+            position = self.neighbour(position, heading)
+        return route
+
+    def step(self):
+        for node in self.nodes.values():
+            node.step()
+        for position, handoff in self.departures():
+            self.deliver(position, handoff)
+
+    def close(self) -> None:
+        for node in self.nodes.values():
+            node.close()
+
+    def departures(self) -> Iterator[Tuple[Optional[Position], Handoff]]:
+        """
+        :return: cars that left an intersection in the last step with the position of the next one,
+        None if they left the grid
+        """
+        for position, node in self.nodes.items():
+            for car in node.departures:
+                yield self.neighbour(position, car.target), Handoff.of(car)
+
+    def deliver(self, position: Optional[Position], handoff: Handoff) -> None:
+        if position is None:
+            self.exited.append(handoff)
+        elif position not in self.nodes:
+            self.outgoing.append((position, handoff))
+        else:
+            self.nodes[position].arrivals[handoff.entry].append(handoff)
+
+    @property
+    def car_count(self) -> int:
+        return sum(len(node.manager.cars) for node in self.nodes.values())
+
+    @property
+    def waiting_count(self) -> int:
+        """
+        :return: number of cars waiting to enter the next intersection
+        """
+        return sum(len(queue) for node in self.nodes.values() for queue in node.arrivals.values())
+
+    def get_agent_rate(self) -> int:
+        """
+        :return: sum of throughputs of all intersections
+        """
+        return sum(node.get_agent_rate() for node in self.nodes.values())
@@ -0,0 +1,38 @@
+from typing import Dict, Hashable, List
+
+from mesa import Model
+
+from autonomous_intersection.agents.visualcell import VisualCell
+from autonomous_intersection.rect import Rect
+
+
+class OverlayLayer:
+    """
+    Fixed set of markers drawn over the cars. Markers are created once and then only shown or hidden,
+    they are not agents of the schedule or the space. A disabled layer ignores all calls.
+    """
+
+    def __init__(self, model: Model, enabled: bool = True):
+        self.model = model
+        self.enabled = enabled
+        self.markers: Dict[Hashable, VisualCell] = {}
+        self.visible: Dict[Hashable, bool] = {}
+
+    def add(self, key: Hashable, rect: Rect, color: str) -> None:
+        """
+        Creates a hidden marker
+        """
+        if not self.enabled:
+            return
+        self.markers[key] = VisualCell((rect.left, rect.top), (rect.width, rect.height), self.model, color, 2)
+        self.visible[key] = False
+
+    def show(self, key: Hashable, visible: bool = True) -> None:
+        if self.enabled:
+            self.visible[key] = visible
+
+    def hide(self, key: Hashable) -> None:
+        self.show(key, False)
+
+    def visible_markers(self) -> List[VisualCell]:
+        return [self.markers[key] for key, visible in self.visible.items() if visible]
@@ -0,0 +1,102 @@
+import itertools
+import multiprocessing
+from multiprocessing.connection import Connection
+from typing import Any, Dict, List, Tuple
+
+from autonomous_intersection.network import Handoff, IntersectionNetwork, Position
+
+
+def partition(rows: int, columns: int, parts: int) -> List[List[Position]]:
+    """
+    :return: consecutive row-major blocks of intersections of roughly equal size
+    """
+    positions = list(itertools.product(range(rows), range(columns)))
+    return [positions[index * len(positions) // parts:(index + 1) * len(positions) // parts]
+            for index in range(parts)]
+
+
+def _work(connection: Connection, positions: List[Position], arguments: dict) -> None:
+    """
+    Steps one part of the network whenever it receives the cars arriving from other parts, None stops it
+    """
+    network = IntersectionNetwork(positions=positions, **arguments)
+    while True:
+        arrivals = connection.recv()
+        if arrivals is None:
+            break
+        for position, handoff in arrivals:
+            network.deliver(position, handoff)
+        network.step()
+        connection.send((network.outgoing, network.exited,
+                         (network.car_count, network.waiting_count, network.get_agent_rate())))
+        network.outgoing = []
+        network.exited = []
+    network.close()
+    connection.close()
+
+
+class PartitionedNetwork:
+    """
+    IntersectionNetwork split into parts stepped in lockstep by worker processes.
+    After every step the workers send back the cars that crossed into another part, which are delivered
+    before the next step. Each entry has a single neighbour feeding it and car ids come from per intersection
+    sequences, so the result is identical to stepping the whole network in one process.
+    """
+
+    def __init__(self, partitions: int = 2, **arguments: Any):
+        self.rows = arguments.get("rows", 2)
+        self.columns = arguments.get("columns", 2)
+        parts = [part for part in partition(self.rows, self.columns, partitions) if part]
+        self.owners: Dict[Position, int] = {position: index for index, part in enumerate(parts) for position in part}
+        self.connections: List[Connection] = []
+        self.processes = []
+        for part in parts:
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_work, args=(child, part, arguments), daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+        self.arrivals: List[List[Tuple[Position, Handoff]]] = [[] for _ in parts]
+        self.exited: List[Handoff] = []
+        self.stats: List[Tuple[int, int, int]] = [(0, 0, 0) for _ in parts]
+        self.running = True
+
+    def step(self):
+        for connection, arrivals in zip(self.connections, self.arrivals):
+            connection.send(arrivals)
+        self.arrivals = [[] for _ in self.connections]
+        for index, connection in enumerate(self.connections):
+            outgoing, exited, self.stats[index] = connection.recv()
+            for position, handoff in outgoing:
+                self.arrivals[self.owners[position]].append((position, handoff))
+            self.exited.extend(exited)
+
+    @property
+    def car_count(self) -> int:
+        return sum(stats[0] for stats in self.stats)
+
+    @property
+    def waiting_count(self) -> int:
+        """
+        :return: number of cars waiting to enter the next intersection, including those between parts
+        """
+        return sum(stats[1] for stats in self.stats) + sum(len(arrivals) for arrivals in self.arrivals)
+
+    def get_agent_rate(self) -> int:
+        return sum(stats[2] for stats in self.stats)
+
+    def close(self) -> None:
+        for connection in self.connections:
+            connection.send(None)
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.connections.clear()
+        self.processes.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,130 @@
+import time
+import weakref
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Callable, Dict, Tuple
+
+import autonomous_intersection.model
+from autonomous_intersection.agents.car import Car
+from autonomous_intersection.rect import Rect
+
+COUNTED_METHODS = ((Rect, "overlaps"), (Car, "simulate"))
+call_counts: Dict[str, int] = defaultdict(int)
+_originals: Dict[Tuple[type, str], Callable] = {}
+_installs = 0
+
+
+def _counted(name: str, method: Callable) -> Callable:
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        call_counts[name] += 1
+        return method(*args, **kwargs)
+
+    return wrapper
+
+
+def install_counters() -> None:
+    """
+    Wraps the counted methods, every call has to be paired with remove_counters
+    """
+    global _installs
+    if not _installs:
+        for cls, name in COUNTED_METHODS:
+            _originals[(cls, name)] = getattr(cls, name)
+            setattr(cls, name, _counted(F"{cls.__name__}.{name}", _originals[(cls, name)]))
+    _installs += 1
+
+
+def remove_counters() -> None:
+    """
+    Restores the counted methods once no profiler counts calls any more
+    """
+    global _installs
+    _installs -= 1
+    if not _installs:
+        for (cls, name), method in _originals.items():
+            setattr(cls, name, method)
+        _originals.clear()
+
+
+class Profiler:
+    """
+    Timers and call counters of the phases of Intersection.step.
+    A disabled profiler hands out a shared no-op context, so instrumentation costs one call per phase.
+    Call counting wraps hot methods while a profiler that counts calls is alive, it can be turned off
+    when only the phase times are needed. The wrappers are removed by close or when the profiler is collected.
+    """
+    _disabled_phase = nullcontext()
+
+    def __init__(self, enabled: bool = False, count_calls: bool = True):
+        self.enabled = enabled
+        self.steps = 0
+        self.times: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.last_times: Dict[str, float] = {}
+        self.last_counters: Dict[str, int] = {}
+        self._counting = None
+        if enabled and count_calls:
+            install_counters()
+            self._counting = weakref.finalize(self, remove_counters)
+
+    def close(self) -> None:
+        """
+        Stops counting calls, phase times are still measured
+        """
+        if self._counting is not None:
+            self._counting()
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return self._disabled_phase
+        return self._measure(name)
+
+    @contextmanager
+    def _measure(self, name: str):
+        counts = dict(call_counts)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.times[name] += elapsed
+            self.calls[name] += 1
+            self.last_times[name] = elapsed
+            for counter, value in call_counts.items():
+                delta = value - counts.get(counter, 0)
+                self.counters[counter] += delta
+                self.last_counters[counter] = self.last_counters.get(counter, 0) + delta
+
+    def start_step(self) -> None:
+        if not self.enabled:
+            return
+        self.steps += 1
+        self.last_times.clear()
+        self.last_counters.clear()
+
+    def report(self) -> dict:
+        total = sum(self.times.values())
+        return {
+            "steps": self.steps,
+            "total_time": total,
+            "phases": {name: {"time": value, "calls": self.calls[name],
+                              "mean_time": value / self.calls[name],
+                              "share": value / total if total else 0.0}
+                       for name, value in self.times.items()},
+            "counters": dict(self.counters),
+        }
+
+    def reporters(self) -> Dict[str, Callable[["autonomous_intersection.model.Intersection"], float]]:
+        """
+        :return: data collector columns with times and call counts of the last step, called with the model
+        """
+        result = {}
+        for name in ("add_new_agents", "remove_cars", "control_cars", "fleet", "schedule", "coast"):
+            result[F"{name} [ms]"] = lambda model, name=name: 1000 * self.last_times.get(name, 0.0)
+        for cls, method in COUNTED_METHODS:
+            counter = F"{cls.__name__}.{method}"
+            result[F"{counter} calls"] = lambda model, counter=counter: self.last_counters.get(counter, 0)
+        return result
@@ -0,0 +1,314 @@
+import argparse
+import json
+import os
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from mesa import Agent, Model
+from mesa.time import BaseScheduler
+
+import autonomous_intersection.model
+from autonomous_intersection.agents.visualcell import VisualCell
+from autonomous_intersection.overlay import OverlayLayer
+from autonomous_intersection.rect import Rect
+
+RECORD = np.dtype([("id", "<u4"), ("x", "<f4"), ("y", "<f4"), ("rotation", "<f4"), ("velocity", "<f4"),
+                   ("target_velocity", "<f4")])
+"""State of a car after a step, the target velocity is the decision of the manager"""
+INDEX = np.dtype([("step", "<u4"), ("offset", "<u8"), ("count", "<u4"), ("markers", "<u4"), ("cars", "<u4")])
+"""Schedule step, position of its records, the number of cars, the bit mask of visible overlay markers
+and the number of entries of cars.bin after the step"""
+CAR = np.dtype([("id", "<u4"), ("width", "<u2"), ("height", "<u2"), ("color", "<u2"), ("max_velocity", "<f4")])
+"""Properties of a car that do not change, written when the car is recorded first, color indexes the palette"""
+VERSION = 2
+
+
+def _cell(cell: VisualCell) -> list:
+    return [cell.x, cell.y, cell.visual_width, cell.visual_height, cell.color, cell.layer, cell.shape, cell.filled]
+
+
+class Recorder:
+    """
+    Appends the state of every car after every step to fixed size records in records.bin. The per step
+    index in index.bin points to the records of each step, so any step can be read from memory mapped files
+    (see Replay). Records are kept in memory and written every chunk_size steps. When the model is restored
+    to an earlier step, the steps recorded after it are dropped (see rewind).
+    meta.json holds the parameters, the static background, the overlay markers and the color palette.
+    """
+
+    def __init__(self, directory: str, model: "autonomous_intersection.model.Intersection", chunk_size: int = 256):
+        self.directory = directory
+        self.chunk_size = max(1, chunk_size)
+        os.makedirs(directory, exist_ok=True)
+        for name in ("records.bin", "index.bin", "cars.bin"):
+            open(os.path.join(directory, name), "wb").close()
+        self.meta = {"version": VERSION, "width": model.width, "height": model.height,
+                     "manager": type(model.manager).__name__, "steps": 0,
+                     "background": [_cell(cell) for cell in model.background],
+                     "markers": [_cell(cell) for cell in model.overlay.markers.values()],
+                     "palette": []}
+        self.colors: Dict[str, int] = {}
+        self.known: set = set()
+        self.records: List[np.ndarray] = []
+        self.index: List[tuple] = []
+        self.cars: List[tuple] = []
+        self.offset = 0
+        self._write_meta()
+
+    def record(self, model: "autonomous_intersection.model.Intersection") -> None:
+        cars = model.manager.cars.values()
+        records = np.empty(len(cars), dtype=RECORD)
+        for position, car in enumerate(cars):
+            state = car.state
+            records[position] = (car.unique_id, state.x, state.y, state.rotation, state.velocity,
+                                 state.target_velocity)
+            if car.unique_id not in self.known:
+                self.known.add(car.unique_id)
+                if car.color not in self.colors:
+                    self.colors[car.color] = len(self.colors)
+                    self.meta["palette"].append(car.color)
+                self.cars.append((car.unique_id, car.width, car.height, self.colors[car.color], car.max_velocity))
+        markers = 0
+        for position, visible in enumerate(model.overlay.visible.values()):
+            if visible:
+                markers |= 1 << position
+        self.records.append(records)
+        self.index.append((model.schedule.steps, self.offset, len(cars), markers, len(self.known)))
+        self.offset += len(cars)
+        if len(self.index) >= self.chunk_size:
+            self.flush()
+
+    def _append(self, name: str, rows: List[tuple], dtype: np.dtype) -> None:
+        with open(os.path.join(self.directory, name), "ab") as file:
+            file.write(np.array(rows, dtype=dtype).tobytes())
+        rows.clear()
+
+    def _write_meta(self) -> None:
+        path = os.path.join(self.directory, "meta.json")
+        with open(path + ".tmp", "w") as file:
+            json.dump(self.meta, file)
+        os.replace(path + ".tmp", path)
+
+    def flush(self) -> None:
+        """
+        Writes the steps recorded since the last flush, Intersection.close calls it when the run ends.
+        Records are written before the index, so a replay opened meanwhile never sees a step without its records.
+        """
+        if not self.index:
+            return
+        self.meta["steps"] += len(self.index)
+        self._append("cars.bin", self.cars, CAR)
+        with open(os.path.join(self.directory, "records.bin"), "ab") as file:
+            file.write(np.concatenate(self.records).tobytes())
+        self.records.clear()
+        self._append("index.bin", self.index, INDEX)
+        self._write_meta()
+
+    def rewind(self, step: int) -> None:
+        """
+        Drops the steps recorded after step and the cars first seen in them, so that the recording follows
+        a model restored to that step
+        """
+        self.flush()
+        index = np.fromfile(os.path.join(self.directory, "index.bin"), dtype=INDEX)
+        kept = int(np.searchsorted(index["step"], step, side="right"))
+        if kept == len(index):
+            return
+        self.offset = int(index["offset"][kept])
+        cars = int(index["cars"][kept - 1]) if kept else 0
+        for name, length in (("index.bin", kept * INDEX.itemsize), ("records.bin", self.offset * RECORD.itemsize),
+                             ("cars.bin", cars * CAR.itemsize)):
+            os.truncate(os.path.join(self.directory, name), length)
+        self.known = set(np.fromfile(os.path.join(self.directory, "cars.bin"), dtype=CAR)["id"].tolist())
+        self.meta["steps"] = kept
+        self._write_meta()
+
+
+def _memmap(path: str, dtype: np.dtype) -> np.ndarray:
+    """
+    :return: read only array mapped to the file, empty files cannot be mapped
+    """
+    if os.path.getsize(path) < dtype.itemsize:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+class Replay:
+    """
+    Recording written by Recorder, steps are numbered like schedule steps after model.step()
+    """
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "meta.json")) as file:
+            self.meta = json.load(file)
+        if self.meta["version"] != VERSION:
+            raise ValueError(F"unsupported recording version {self.meta['version']}")
+        self.index = _memmap(os.path.join(directory, "index.bin"), INDEX)[:self.meta["steps"]]
+        self.records = _memmap(os.path.join(directory, "records.bin"), RECORD)
+        cars = np.fromfile(os.path.join(directory, "cars.bin"), dtype=CAR)
+        self.cars: Dict[int, np.void] = {int(car["id"]): car for car in cars}
+        self.palette: List[str] = self.meta["palette"]
+
+    @property
+    def steps(self) -> int:
+        """
+        :return: last recorded step, 0 if nothing was recorded
+        """
+        return int(self.index["step"][-1]) if len(self.index) else 0
+
+    def _position(self, step: int) -> int:
+        position = int(np.searchsorted(self.index["step"], step))
+        if position == len(self.index) or self.index["step"][position] != step:
+            raise IndexError(F"step {step} is not in the recording of {self.steps} steps")
+        return position
+
+    def next_step(self, step: int) -> Optional[int]:
+        """
+        :return: first recorded step after step, None if there is none
+        """
+        position = int(np.searchsorted(self.index["step"], step, side="right"))
+        return int(self.index["step"][position]) if position < len(self.index) else None
+
+    def frame(self, step: int) -> np.ndarray:
+        """
+        :return: records of all cars after the step
+        """
+        _, offset, count, _, _ = self.index[self._position(step)]
+        return self.records[offset:offset + count]
+
+    def markers(self, step: int) -> List[int]:
+        """
+        :return: positions of overlay markers visible after the step in meta["markers"]
+        """
+        mask = int(self.index[self._position(step)]["markers"])
+        return [position for position in range(len(self.meta["markers"])) if mask >> position & 1]
+
+    def frames(self, start: int = 1, stop: Optional[int] = None) -> Iterator[Tuple[int, np.ndarray]]:
+        for step in self.index["step"].tolist():
+            if step >= start and (stop is None or step <= stop):
+                yield step, self.frame(step)
+
+
+class ReplayCar(Agent):
+    """
+    Recorded car drawn like Car
+    """
+
+    def __init__(self, unique_id: int, model: Model, width: int, height: int, color: str):
+        super().__init__(unique_id, model)
+        self.visual_width = width - 4
+        self.visual_height = height - 2
+        self.color = color
+        self.shape = "rect"
+        self.layer = 1
+        self.filled = True
+        self.x = self.y = self.rotation = 0.0
+
+
+class ReplayModel(Model):
+    """
+    Plays a recording back for ContinuousCanvas without simulating, start is the first step shown
+    """
+
+    def __init__(self, path: str, start: int = 1, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replay = Replay(path)
+        self.width, self.height = self.replay.meta["width"], self.replay.meta["height"]
+        self.background = [VisualCell((x, y), (w, h), self, color, layer, shape, filled)
+                           for x, y, w, h, color, layer, shape, filled in self.replay.meta["background"]]
+        self.overlay = OverlayLayer(self)
+        for position, (x, y, w, h, color, *_) in enumerate(self.replay.meta["markers"]):
+            self.overlay.add(position, Rect(x, y, w, h), color)
+        self.schedule = BaseScheduler(self)
+        self.cars: Dict[int, ReplayCar] = {}
+        self.current = 0
+        first = self.replay.next_step(max(1, min(int(start), self.replay.steps)) - 1)
+        self.running = first is not None
+        if self.running:
+            self.seek(first)
+
+    def seek(self, step: int) -> None:
+        frame = self.replay.frame(step)
+        ids = set(frame["id"].tolist())
+        for car_id in [car_id for car_id in self.cars if car_id not in ids]:
+            self.schedule.remove(self.cars.pop(car_id))
+        for record in frame:
+            car_id = int(record["id"])
+            car = self.cars.get(car_id)
+            if car is None:
+                properties = self.replay.cars[car_id]
+                car = self.cars[car_id] = ReplayCar(car_id, self, int(properties["width"]),
+                                                    int(properties["height"]),
+                                                    self.replay.palette[properties["color"]])
+                self.schedule.add(car)
+            car.x, car.y, car.rotation = float(record["x"]), float(record["y"]), float(record["rotation"])
+        visible = set(self.replay.markers(step))
+        for position in self.overlay.markers:
+            self.overlay.show(position, position in visible)
+        self.current = step
+        self.schedule.steps = step
+
+    def step(self):
+        step = self.replay.next_step(self.current)
+        if step is None:
+            self.running = False
+            return
+        self.seek(step)
+
+
+def record(directory: str, steps: int, chunk_size: int = 256, **parameters) -> Replay:
+    """
+    Runs the model without visualization and records it, overlay markers are recorded too
+    """
+    model = autonomous_intersection.model.Intersection(record_dir=directory, record_chunk_size=chunk_size,
+                                                       **parameters)
+    for _ in range(steps):
+        model.step()
+    model.close()
+    return Replay(directory)
+
+
+def parse_args(argv=None):
+    from autonomous_intersection.run import MANAGERS, parse_parameter
+    parser = argparse.ArgumentParser(description="Records runs of the intersection model and replays them")
+    commands = parser.add_subparsers(dest="command", required=True)
+    recording = commands.add_parser("record", help="run the model headless and record it")
+    recording.add_argument("directory")
+    recording.add_argument("--manager", default="Prediction", choices=MANAGERS)
+    recording.add_argument("--spawn-rate", type=int, default=10)
+    recording.add_argument("--steps", type=int, default=1000)
+    recording.add_argument("--seed", type=int, default=0)
+    recording.add_argument("--chunk-size", type=int, default=256, help="steps written at once")
+    recording.add_argument("--param", dest="parameters", action="append", type=parse_parameter, default=[],
+                           metavar="KEY=VALUE")
+    show = commands.add_parser("show", help="print the cars of steps of a recording")
+    show.add_argument("directory")
+    show.add_argument("--step", type=int, default=1)
+    show.add_argument("--count", type=int, default=1, help="number of steps from --step")
+    serve = commands.add_parser("serve", help="replay a recording in the browser")
+    serve.add_argument("directory")
+    serve.add_argument("--port", type=int, default=2222)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    if args.command == "record":
+        replay = record(args.directory, args.steps, args.chunk_size, manager=args.manager,
+                        spawn_rate=args.spawn_rate, seed=args.seed, **dict(args.parameters))
+        print(F"{replay.steps} steps, {len(replay.records)} car records written to {args.directory}")
+    elif args.command == "show":
+        replay = Replay(args.directory)
+        for step, frame in replay.frames(args.step, args.step + args.count - 1):
+            print(F"step {step}: {len(frame)} cars, markers {replay.markers(step)}")
+            for car in frame:
+                print(F"  {car['id']:6} x {car['x']:7.1f} y {car['y']:7.1f} rotation {car['rotation']:6.2f} "
+                      F"velocity {car['velocity']:5.1f} target {car['target_velocity']:5.1f}")
+    else:
+        from autonomous_intersection.server import replay_server
+        replay_server(args.directory).launch(args.port)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,8 +1,17 @@
 import math
-from typing import Tuple
+from typing import Tuple, Optional
+
+AXIS_ALIGNED_TOLERANCE = 0.01
+"""Rotation in radians up to which a rect counts as rotated by a multiple of right angle"""
 
 
 class Rect:
+    """
+    Rectangle rotated around its center. Bounding box and corner points are computed on first use and cached,
+    so a rect must not be modified after creation.
+    """
+    __slots__ = ("left", "top", "width", "height", "rotation", "_center_without_rotation_cache", "_box", "_points")
+
     def __init__(self, x, y, w, h, rotation=0.0):
         self.left = x
         self.top = y
@@ -10,6 +19,8 @@ class Rect:
         self.height = h
         self.rotation = rotation
         self._center_without_rotation_cache = self._center_without_rotation
+        self._box: Optional[Tuple[float, float, float, float]] = None
+        self._points: Optional[Tuple[Tuple[float, float], ...]] = None
 
     @property
     def bottom(self):
@@ -20,11 +31,38 @@ class Rect:
         return self.left + self.width
 
     def __contains__(self, r2: "Rect") -> bool:
+        return self.overlaps(r2)
+
+    def overlaps(self, r2: "Rect", exact: bool = False) -> bool:
+        """
+        :param exact: confirm overlapping bounding boxes of rects rotated by other than a right angle
+        with a separating axis test of the actual corners
+        """
         if not self.intersection_heuristic(r2):
             return False
-        r1 = self._bounding_box()
-        r2 = r2._bounding_box()
-        return not (r2.left > r1.right or r2.right < r1.left or r2.top > r1.bottom or r2.bottom < r1.top)
+        left1, top1, right1, bottom1 = self.aabb
+        left2, top2, right2, bottom2 = r2.aabb
+        if left2 > right1 or right2 < left1 or top2 > bottom1 or bottom2 < top1:
+            return False
+        if exact and not (self.is_axis_aligned and r2.is_axis_aligned):
+            return self.separating_axis_test(r2)
+        return True
+
+    @property
+    def aabb(self) -> Tuple[float, float, float, float]:
+        """
+        :return: left, top, right and bottom of the axis aligned bounding box
+        """
+        left, top, width, height = self._bounding_box()
+        return left, top, left + width, top + height
+
+    @property
+    def is_axis_aligned(self) -> bool:
+        """
+        Rects rotated by a multiple of right angle, up to AXIS_ALIGNED_TOLERANCE as in _compute_bounding_box,
+        are taken as equal to their bounding box
+        """
+        return abs(math.remainder(self.rotation, math.pi / 2)) <= AXIS_ALIGNED_TOLERANCE
 
     def intersection_heuristic(self, other: "Rect") -> bool:
         """
@@ -35,6 +73,20 @@ class Rect:
         dist = max(abs(center1[0] - center2[0]), abs(center1[1] - center2[1]))
         return dist < self.width + self.height + other.width + other.height
 
+    def separating_axis_test(self, other: "Rect") -> bool:
+        """
+        Exact overlap test of two rotated rects, touching rects overlap
+        """
+        points1 = self._get_points()
+        points2 = other._get_points()
+        for angle in (self.rotation, other.rotation):
+            for axis in ((math.cos(angle), math.sin(angle)), (-math.sin(angle), math.cos(angle))):
+                projection1 = [x * axis[0] + y * axis[1] for x, y in points1]
+                projection2 = [x * axis[0] + y * axis[1] for x, y in points2]
+                if max(projection1) < min(projection2) or max(projection2) < min(projection1):
+                    return False
+        return True
+
     def __eq__(self, other):
         return (self.width == other.width and self.height == other.height
                 and self.left == other.top and self.right == other.right and self.rotation == other.rotation)
@@ -43,32 +95,45 @@ class Rect:
     def center(self) -> Tuple[float, float]:
         if self.rotation == 0:
             return self._center_without_rotation
-        return self._bounding_box().center
+        left, top, width, height = self._bounding_box()
+        return left + width / 2, top + height / 2
 
     @property
     def _center_without_rotation(self):
         return self.left + self.width / 2, self.top + self.height / 2
 
     def __str__(self):
-        return str(self._get_points())
+        return str(list(self._get_points()))
 
     def __repr__(self):
         return self.__str__()
 
-    def _get_points(self):
-        points = [(self.left, self.top), (self.right, self.top), (self.right, self.bottom), (self.left, self.bottom)]
-        return list(map(lambda x: self._rotate(self._center_without_rotation, x, self.rotation), points))
+    def _get_points(self) -> Tuple[Tuple[float, float], ...]:
+        if self._points is None:
+            center = self._center_without_rotation_cache
+            self._points = tuple(self._rotate(center, point, self.rotation) for point in (
+                (self.left, self.top), (self.right, self.top), (self.right, self.bottom), (self.left, self.bottom)))
+        return self._points
+
+    def _bounding_box(self) -> Tuple[float, float, float, float]:
+        """
+        :return: left, top, width and height of the axis aligned bounding box
+        """
+        if self._box is None:
+            self._box = self._compute_bounding_box()
+        return self._box
 
-    def _bounding_box(self):
-        if math.isclose(self.rotation, math.pi, abs_tol=0.01) or math.isclose(self.rotation, 0, abs_tol=0.01):
-            return Rect(self.left, self.top, self.width, self.height, 0)
-        if math.isclose(self.rotation % (math.pi / 2), 0, abs_tol=0.01):
+    def _compute_bounding_box(self) -> Tuple[float, float, float, float]:
+        if math.isclose(self.rotation, math.pi, abs_tol=AXIS_ALIGNED_TOLERANCE) or \
+                math.isclose(self.rotation, 0, abs_tol=AXIS_ALIGNED_TOLERANCE):
+            return self.left, self.top, self.width, self.height
+        if math.isclose(self.rotation % (math.pi / 2), 0, abs_tol=AXIS_ALIGNED_TOLERANCE):
             center = self._center_without_rotation
-            return Rect(center[0] - self.height / 2, center[1] - self.width / 2, self.height, self.width)
+            return center[0] - self.height / 2, center[1] - self.width / 2, self.height, self.width
         x_coordinates, y_coordinates = zip(*self._get_points())
         mx = min(x_coordinates)
         my = min(y_coordinates)
-        return Rect(mx, my, max(x_coordinates) - mx, max(y_coordinates) - my, 0)
+        return mx, my, max(x_coordinates) - mx, max(y_coordinates) - my
 
     @staticmethod
     def _rotate(origin, point, angle):
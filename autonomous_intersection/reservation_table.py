@@ -0,0 +1,147 @@
+from math import ceil, floor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import autonomous_intersection.agents.car
+from autonomous_intersection.rect import Rect
+
+
+class ReservationTable:
+    """
+    Area split into a grid of square tiles with one occupancy bitset per time step.
+    Each bit is a tile, a rect occupies every tile its bounding box touches. Rects reaching out of the area also
+    occupy one extra bit shared by everything outside. Tiles are only a broad phase, a rect is free when
+    no tile is taken or when none of the reserved rects owning the taken tiles overlaps it.
+    """
+
+    def __init__(self, area: Rect, tile_size: float, exact: bool = False):
+        self.left, self.top = area.left, area.top
+        self.tile_size = tile_size
+        self.exact = exact
+        self.columns = max(1, ceil(area.width / tile_size))
+        self.rows = max(1, ceil(area.height / tile_size))
+        self.slices: Dict[int, int] = {}
+        self.footprints: Dict["autonomous_intersection.agents.car.Car", Dict[int, int]] = {}
+        self.rects: Dict["autonomous_intersection.agents.car.Car", Dict[int, Rect]] = {}
+        self.admitted: Set["autonomous_intersection.agents.car.Car"] = set()
+        """Cars that reserved their crossing, they stay admitted until they are released"""
+        self.outside = 1 << (self.columns * self.rows)
+        self.owners: Dict[int, List["autonomous_intersection.agents.car.Car"]] = {}
+        self.entries = 0
+        self.first_step = 0
+
+    def __contains__(self, car: "autonomous_intersection.agents.car.Car") -> bool:
+        return car in self.admitted
+
+    def _tile_range(self, start: float, end: float, origin: float, count: int) -> Tuple[int, int, bool]:
+        """
+        :return: first and last tile clamped to the area and whether the range reaches out of it
+        """
+        first = floor((start - origin) / self.tile_size)
+        last = floor((end - origin) / self.tile_size)
+        return max(0, first), min(count - 1, last), first < 0 or last > count - 1
+
+    def mask(self, rect: Rect) -> int:
+        left, top, right, bottom = rect.aabb
+        first_column, last_column, columns_out = self._tile_range(left, right, self.left, self.columns)
+        first_row, last_row, rows_out = self._tile_range(top, bottom, self.top, self.rows)
+        result = self.outside if columns_out or rows_out else 0
+        if first_column > last_column or first_row > last_row:
+            return result
+        row = ((1 << (last_column - first_column + 1)) - 1) << first_column
+        for index in range(first_row, last_row + 1):
+            result |= row << (index * self.columns)
+        return result
+
+    def is_free(self, step: int, mask: int, rect: Optional[Rect] = None) -> bool:
+        """
+        :param rect: rect with the given mask, without it only the tiles are compared
+        """
+        if not mask & self.slices.get(step, 0):
+            return True
+        if rect is None:
+            return False
+        return not any(rect.overlaps(self.rects[owner][step], self.exact) for owner in self.owners[step])
+
+    @property
+    def size(self) -> int:
+        """
+        :return: number of live reservations, one per car and time step
+        """
+        return self.entries
+
+    def __len__(self):
+        return len(self.footprints)
+
+    def reserve(self, car: "autonomous_intersection.agents.car.Car",
+                footprint: Iterable[Tuple[int, int, Rect]]) -> None:
+        """
+        :param footprint: time step, tiles and rect of the car at that step
+        """
+        self.admitted.add(car)
+        masks = self.footprints.setdefault(car, {})
+        rects = self.rects.setdefault(car, {})
+        for step, mask, rect in footprint:
+            if step < self.first_step or step in masks:
+                continue
+            self.owners.setdefault(step, []).append(car)
+            self.entries += 1
+            masks[step] = mask
+            rects[step] = rect
+            self.slices[step] = self.slices.get(step, 0) | mask
+
+    def _rebuild(self, step: int) -> None:
+        """
+        Tiles of different cars can overlap, so a slice is recomputed from the remaining owners
+        """
+        slice_ = 0
+        for owner in self.owners.get(step, ()):
+            slice_ |= self.footprints[owner][step]
+        if slice_:
+            self.slices[step] = slice_
+        else:
+            self.slices.pop(step, None)
+            self.owners.pop(step, None)
+
+    def release(self, car: "autonomous_intersection.agents.car.Car") -> None:
+        self.admitted.discard(car)
+        self.rects.pop(car, None)
+        for step in self.footprints.pop(car, {}):
+            self.owners[step].remove(car)
+            self.entries -= 1
+            self._rebuild(step)
+
+    def get_state(self) -> dict:
+        """
+        :return: reservations with cars referred to by their ids
+        """
+        return {"slices": dict(self.slices),
+                "footprints": {car.unique_id: dict(footprint) for car, footprint in self.footprints.items()},
+                "rects": {car.unique_id: dict(rects) for car, rects in self.rects.items()},
+                "admitted": [car.unique_id for car in self.admitted],
+                "owners": {step: [car.unique_id for car in cars] for step, cars in self.owners.items()},
+                "entries": self.entries, "first_step": self.first_step}
+
+    def set_state(self, state: dict, cars: Dict[int, "autonomous_intersection.agents.car.Car"]) -> None:
+        self.slices = dict(state["slices"])
+        self.footprints = {cars[car_id]: dict(footprint) for car_id, footprint in state["footprints"].items()}
+        self.rects = {cars[car_id]: dict(rects) for car_id, rects in state["rects"].items()}
+        self.admitted = {cars[car_id] for car_id in state["admitted"]}
+        self.owners = {step: [cars[car_id] for car_id in owners] for step, owners in state["owners"].items()}
+        self.entries = state["entries"]
+        self.first_step = state["first_step"]
+
+    def advance(self, step: int) -> None:
+        """
+        Drops all time slices before the given step together with the cars whose reservations have all expired
+        """
+        for past in range(self.first_step, step):
+            self.slices.pop(past, None)
+            for car in self.owners.pop(past, []):
+                footprint = self.footprints[car]
+                del footprint[past]
+                del self.rects[car][past]
+                self.entries -= 1
+                if not footprint:
+                    del self.footprints[car]
+                    del self.rects[car]
+        self.first_step = max(self.first_step, step)
@@ -0,0 +1,74 @@
+import argparse
+import ast
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+MANAGERS = ("TrafficLight", "BasicReservation", "AdvancedReservation", "Prediction")
+"""Names of Manager members, repeated here so that parsing arguments does not import the model"""
+
+
+def parse_parameter(text: str) -> Tuple[str, Any]:
+    """
+    :param text: key=value, the value is read as a Python literal and kept as a string if it is not one
+    """
+    key, separator, value = text.partition("=")
+    if not separator:
+        raise argparse.ArgumentTypeError(F"expected key=value, got {text}")
+    try:
+        return key, ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return key, value
+
+
+def run(manager: str, spawn_rate: int, steps: int, seed: int, parameters: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Imports the model, creates it and runs it without any visualization
+    :return: import, construction and first step latency in milliseconds, speed of the remaining steps
+    and the throughput
+    """
+    start = time.perf_counter()
+    from autonomous_intersection.model import Intersection
+    imported = time.perf_counter()
+    model = Intersection(spawn_rate=spawn_rate, manager=manager, seed=seed, headless=True, **parameters)
+    created = time.perf_counter()
+    model.step()
+    first_step = time.perf_counter()
+    done = 1
+    while done < steps:
+        done += model.advance(steps - done)
+    end = time.perf_counter()
+    model.close()
+    return {"import_ms": (imported - start) * 1000,
+            "create_ms": (created - imported) * 1000,
+            "first_step_ms": (first_step - created) * 1000,
+            "steps_per_second": (steps - 1) / (end - first_step) if steps > 1 and end > first_step else 0.0,
+            "throughput": model.get_agent_rate()}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Single headless run of the intersection model")
+    parser.add_argument("--manager", default="Prediction", choices=MANAGERS)
+    parser.add_argument("--spawn-rate", type=int, default=10)
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--param", dest="parameters", action="append", type=parse_parameter, default=[],
+                        metavar="KEY=VALUE", help="model parameter, e.g. velocity=40 or fast_forward=True")
+    parser.add_argument("--json", action="store_true", help="print the report as a JSON object")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> None:
+    args = parse_args(argv)
+    report = run(args.manager, args.spawn_rate, max(args.steps, 1), args.seed, dict(args.parameters))
+    if args.json:
+        import json
+        print(json.dumps(report))
+    else:
+        print(F"import {report['import_ms']:.1f} ms, model {report['create_ms']:.1f} ms, "
+              F"first step {report['first_step_ms']:.1f} ms, {report['steps_per_second']:.1f} steps/s, "
+              F"throughput {report['throughput']} cars/min")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,12 +1,12 @@
-from mesa.visualization.ModularVisualization import ModularServer
 from mesa.visualization.UserParam import UserSettableParameter
 
-from .continuous_canvas import ContinuousCanvas
+from .continuous_canvas import CanvasServer, ContinuousCanvas
 from .model import Intersection, Manager
 from .portrayal import portrayCell
+from .recording import Replay, ReplayModel
 from .throughput_counter import ThroughputCounter
 
-canvas_element = ContinuousCanvas(portrayCell, 1000, 1000)
+canvas_element = ContinuousCanvas(portrayCell, 1000, 1000, binary=True)
 
 model_params = {
     "spawn_rate": UserSettableParameter(
@@ -44,6 +44,19 @@ model_params = {
     )
 }
 
-server = ModularServer(
+server = CanvasServer(
     Intersection, [canvas_element, ThroughputCounter()], "Autonomous Intersection", model_params
 )
+
+
+def replay_server(path: str) -> CanvasServer:
+    """
+    Server that plays a recording back, the start step can be changed in the browser
+    """
+    meta = Replay(path).meta
+    params = {
+        "path": path,
+        "start": UserSettableParameter("number", "Start step", 1, description="First step shown"),
+    }
+    return CanvasServer(ReplayModel, [ContinuousCanvas(portrayCell, meta["height"], meta["width"], binary=True)],
+                         "Autonomous Intersection replay", params)
@@ -0,0 +1,160 @@
+import argparse
+import csv
+import itertools
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, asdict, fields
+from functools import partial
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+from autonomous_intersection.cache import DEFAULT_DIRECTORY, ResultCache
+from autonomous_intersection.model import Intersection, Manager
+
+
+@dataclass(frozen=True)
+class RunConfig:
+    manager: str
+    spawn_rate: int
+    velocity: int
+    acceleration: int
+    seed: int
+    steps: int
+    width: int = 1000
+    height: int = 1000
+    fast_forward: bool = False
+
+
+@dataclass
+class RunResult:
+    manager: str
+    spawn_rate: int
+    velocity: int
+    acceleration: int
+    seed: int
+    steps: int
+    width: int
+    height: int
+    fast_forward: bool
+    throughput: int
+    steps_per_second: Optional[float]
+    wall_time: Optional[float]
+    cached: bool = False
+    """Taken from the cache, the run is not timed then"""
+
+
+def run_config(config: RunConfig) -> RunResult:
+    """
+    Runs a single model without any visualization
+    """
+    model = Intersection(config.height, config.width, config.spawn_rate, config.manager,
+                         velocity=config.velocity, acceleration=config.acceleration, seed=config.seed,
+                         fast_forward=config.fast_forward, headless=True)
+    start = time.perf_counter()
+    done = 0
+    while done < config.steps:
+        done += model.advance(config.steps - done)
+    wall_time = time.perf_counter() - start
+    model.close()
+    return RunResult(**asdict(config), throughput=model.get_agent_rate(),
+                     steps_per_second=config.steps / wall_time if wall_time > 0 else float("inf"),
+                     wall_time=wall_time)
+
+
+def grid(managers: Iterable[str], spawn_rates: Iterable[int], velocities: Iterable[int],
+         accelerations: Iterable[int], seeds: Iterable[int], steps: int, width: int = 1000,
+         height: int = 1000, fast_forward: bool = False) -> List[RunConfig]:
+    return [RunConfig(manager, spawn_rate, velocity, acceleration, seed, steps, width, height, fast_forward)
+            for manager, spawn_rate, velocity, acceleration, seed in
+            itertools.product(managers, spawn_rates, velocities, accelerations, seeds)]
+
+
+def cache_key(config: RunConfig) -> dict:
+    """
+    :return: parameters of the run that change its results, fast forward does not
+    """
+    parameters = asdict(config)
+    del parameters["fast_forward"]
+    return parameters
+
+
+def _store(cache: ResultCache, config: RunConfig, future: Future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        # timings belong to the run that measured them and are not stored
+        cache.put(cache_key(config), {"throughput": future.result().throughput})
+
+
+def sweep(configs: Sequence[RunConfig], processes: Optional[int] = None,
+          cache: Optional[ResultCache] = None) -> Iterator[RunResult]:
+    """
+    Runs every configuration in a process pool, results are yielded in configuration order
+    :param cache: configurations found in it are not run again, every finished run is stored in it
+    as soon as it ends, so an interrupted sweep resumes from the completed runs
+    """
+    cached = [cache.get(cache_key(config)) if cache is not None else None for config in configs]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = []
+        for config, result in zip(configs, cached):
+            if result is not None:
+                futures.append(None)
+                continue
+            future = executor.submit(run_config, config)
+            if cache is not None:
+                future.add_done_callback(partial(_store, cache, config))
+            futures.append(future)
+        for config, result, future in zip(configs, cached, futures):
+            if future is None:
+                yield RunResult(**asdict(config), throughput=result["throughput"], steps_per_second=None,
+                                wall_time=None, cached=True)
+            else:
+                yield future.result()
+
+
+def write_results(results: Iterable[RunResult], path: str) -> int:
+    count = 0
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=[field.name for field in fields(RunResult)])
+        writer.writeheader()
+        for result in results:
+            writer.writerow(asdict(result))
+            file.flush()
+            count += 1
+    return count
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless parameter sweep of the intersection model")
+    parser.add_argument("--managers", nargs="+", default=[manager.name for manager in Manager],
+                        choices=[manager.name for manager in Manager])
+    parser.add_argument("--spawn-rates", nargs="+", type=int, default=[10])
+    parser.add_argument("--velocities", nargs="+", type=int, default=[40])
+    parser.add_argument("--accelerations", nargs="+", type=int, default=[30])
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0])
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--width", type=int, default=1000)
+    parser.add_argument("--height", type=int, default=1000)
+    parser.add_argument("--fast-forward", action="store_true",
+                        help="skip control decisions in free flow, results are unchanged")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--cache-dir", default=DEFAULT_DIRECTORY)
+    parser.add_argument("--no-cache", action="store_true", help="run every configuration again")
+    parser.add_argument("--cache-max-mb", type=float, default=256)
+    parser.add_argument("--cache-max-days", type=float, default=30)
+    parser.add_argument("--output", default="sweep.csv")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configs = grid(args.managers, args.spawn_rates, args.velocities, args.accelerations, args.seeds, args.steps,
+                   args.width, args.height, args.fast_forward)
+    cache = None if args.no_cache else ResultCache(args.cache_dir, int(args.cache_max_mb * 2 ** 20),
+                                                    args.cache_max_days * 24 * 3600)
+    start = time.perf_counter()
+    count = write_results(sweep(configs, args.processes, cache), args.output)
+    print(F"{count} runs written to {args.output} in {time.perf_counter() - start:.1f} s")
+    if cache is not None:
+        print(F"{cache.hits} runs taken from the cache, {cache.evict()} old entries evicted")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+from collections import OrderedDict
+from typing import Callable, Hashable, Tuple, TypeVar
+
+import autonomous_intersection.agents.car
+from autonomous_intersection.rect import Rect
+
+T = TypeVar("T")
+
+
+class TrajectoryLibrary:
+    """
+    LRU cache of simulated car motion.
+    Cars entering from the same lane with the same target, size and velocity profile pass through the same states,
+    so a path is keyed on those values and the full state the simulation starts from.
+    """
+
+    def __init__(self, max_size: int = 16384, exact: bool = False):
+        """
+        :param exact: test whether the car is in the crossed area as in Rect.overlaps
+        """
+        self.max_size = max_size
+        self.exact = exact
+        self.entries: "OrderedDict[Hashable, object]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def profile(car: "autonomous_intersection.agents.car.Car") -> tuple:
+        return (car.initial_direction, car.target, car.width, car.height, car.max_velocity, car.acceleration,
+                car.deceleration, car.closed_form_turns)
+
+    @staticmethod
+    def state_key(state: "autonomous_intersection.agents.car.Car.State", start: bool) -> tuple:
+        """
+        Starting a car overrides its target velocity, so it does not affect the path
+        """
+        return state.key(ignore_target_velocity=start)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: Hashable, compute: Callable[[], T]) -> T:
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        value = compute()
+        self.entries[key] = value
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return value
+
+    def next_state(self, car: "autonomous_intersection.agents.car.Car",
+                   state: "autonomous_intersection.agents.car.Car.State",
+                   start: bool = True) -> "autonomous_intersection.agents.car.Car.State":
+        """
+        Same as car.simulate(state, 1, start)
+        """
+        key = ("step", self.profile(car), self.state_key(state, start), start)
+        return self._lookup(key, lambda: car.simulate(state, 1, start)).copy()
+
+    def next_rect(self, car: "autonomous_intersection.agents.car.Car") -> Rect:
+        key = ("rect", self.profile(car), self.state_key(car.state, True))
+        return self._lookup(key, lambda: car.rect(self.next_state(car, car.state)))
+
+    def crossing(self, car: "autonomous_intersection.agents.car.Car", area: Rect) -> Tuple[Rect, ...]:
+        """
+        :return: rects of the car for every future step, until it has entered and left the area
+        """
+        key = ("crossing", self.profile(car), self.state_key(car.state, True), area.aabb)
+        return self._lookup(key, lambda: self._simulate_crossing(car, area))
+
+    def _simulate_crossing(self, car: "autonomous_intersection.agents.car.Car", area: Rect) -> Tuple[Rect, ...]:
+        state = car.state
+        rects = []
+        visited = False
+        while not visited or area.overlaps(car.rect(state), self.exact):
+            state = self.next_state(car, state)
+            rects.append(car.rect(state))
+            if not visited and area.overlaps(rects[-1], self.exact):
+                visited = True
+        return tuple(rects)
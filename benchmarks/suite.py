@@ -0,0 +1,168 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+
+from autonomous_intersection.model import Intersection, Manager
+
+SPAWN_RATES = {"low": 10, "medium": 30, "saturated": 80}
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+@dataclass(frozen=True)
+class Scenario:
+    manager: str
+    load: str
+    steps: int = 1000
+    seed: int = 1
+    velocity: int = 50
+    acceleration: int = 20
+
+    @property
+    def name(self) -> str:
+        return F"{self.manager}/{self.load}"
+
+
+@dataclass
+class Measurement:
+    scenario: str
+    steps: int
+    steps_per_second: float
+    peak_rss_mb: float
+    control_cars_share: float
+    schedule_share: float
+    throughput: int
+    steps_per_second_spread: float = 0.0
+    """Interquartile range of the repeats relative to the median steps_per_second"""
+
+
+def scenarios(managers: Optional[List[str]] = None, loads: Optional[List[str]] = None,
+              steps: int = 1000) -> List[Scenario]:
+    return [Scenario(manager, load, steps) for manager in managers or [manager.name for manager in Manager]
+            for load in loads or list(SPAWN_RATES)]
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def _run(scenario: Scenario) -> Tuple[float, float, float, int]:
+    """
+    :return: steps per second of one run, time shares of control_cars and schedule and the throughput
+    """
+    model = Intersection(spawn_rate=SPAWN_RATES[scenario.load], manager=scenario.manager, seed=scenario.seed,
+                         velocity=scenario.velocity, acceleration=scenario.acceleration, profile=True,
+                         profile_calls=False, headless=True)
+    start = time.perf_counter()
+    for _ in range(scenario.steps):
+        model.step()
+    wall_time = time.perf_counter() - start
+    model.close()
+    phases = model.profile_report()["phases"]
+    return (scenario.steps / wall_time, phases["control_cars"]["share"], phases["schedule"]["share"],
+            model.get_agent_rate())
+
+
+def measure(scenario: Scenario, repeats: int = 5) -> Measurement:
+    """
+    Runs the scenario once to warm up and then repeats times with phase timers on, call counters stay off
+    to keep the timing undisturbed. Runs are deterministic, so only the timing differs between them.
+    :return: median steps per second with the interquartile range of the repeats relative to it,
+    phase shares of the median run
+    """
+    _run(scenario)
+    runs = sorted(_run(scenario) for _ in range(max(1, repeats)))
+    speeds = [run[0] for run in runs]
+    median = statistics.median(speeds)
+    first, _, third = statistics.quantiles(speeds, n=4) if len(speeds) > 1 else (median, median, median)
+    _, control_share, schedule_share, throughput = runs[len(runs) // 2]
+    return Measurement(scenario.name, scenario.steps, median, _peak_rss_mb(), control_share, schedule_share,
+                       throughput, (third - first) / median)
+
+
+def measure_isolated(scenario: Scenario, repeats: int = 5) -> Measurement:
+    """
+    Runs the scenario in a fresh process, so the peak memory belongs to that scenario alone
+    """
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(measure, scenario, repeats).result()
+
+
+def load_baseline(path: str) -> Dict[str, Measurement]:
+    with open(path) as file:
+        return {name: Measurement(**values) for name, values in json.load(file).items()}
+
+
+def save_baseline(measurements: List[Measurement], path: str) -> None:
+    """
+    Replaces the measured scenarios in the baseline file, other scenarios are kept
+    """
+    stored = load_baseline(path) if os.path.exists(path) else {}
+    stored.update({measurement.scenario: measurement for measurement in measurements})
+    with open(path, "w") as file:
+        json.dump({name: asdict(measurement) for name, measurement in stored.items()}, file, indent=2)
+        file.write("\n")
+
+
+def compare(measurement: Measurement, baseline: Measurement, threshold: float) -> List[str]:
+    """
+    :param threshold: allowed relative slowdown and memory growth, the allowed slowdown is widened
+    to the spreads of the baseline and the measurement when they are larger
+    :return: descriptions of regressions, empty if there are none
+    """
+    problems = []
+    slowdown = max(threshold, baseline.steps_per_second_spread + measurement.steps_per_second_spread)
+    if measurement.steps_per_second < baseline.steps_per_second * (1 - slowdown):
+        problems.append(F"steps per second {baseline.steps_per_second:.1f} -> {measurement.steps_per_second:.1f}")
+    if measurement.peak_rss_mb > baseline.peak_rss_mb * (1 + threshold):
+        problems.append(F"peak RSS {baseline.peak_rss_mb:.1f} -> {measurement.peak_rss_mb:.1f} MB")
+    if measurement.throughput != baseline.throughput:
+        problems.append(F"simulated throughput {baseline.throughput} -> {measurement.throughput}")
+    return problems
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fixed seed benchmarks of every manager")
+    parser.add_argument("--managers", nargs="+", choices=[manager.name for manager in Manager])
+    parser.add_argument("--loads", nargs="+", choices=list(SPAWN_RATES))
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs of every scenario after a warm-up run")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--update", action="store_true", help="store the results as the new baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    baseline = load_baseline(args.baseline) if os.path.exists(args.baseline) and not args.update else {}
+    measurements = []
+    regressions = 0
+    print(F"{'scenario':32}{'steps/s':>10}{'spread':>8}{'RSS MB':>10}{'control':>9}{'schedule':>10}{'cars/min':>10}")
+    for scenario in scenarios(args.managers, args.loads, args.steps):
+        measurement = measure_isolated(scenario, args.repeats)
+        measurements.append(measurement)
+        print(F"{measurement.scenario:32}{measurement.steps_per_second:10.1f}"
+              F"{measurement.steps_per_second_spread:8.0%}{measurement.peak_rss_mb:10.1f}"
+              F"{measurement.control_cars_share:9.0%}{measurement.schedule_share:10.0%}{measurement.throughput:10}")
+        if scenario.name in baseline and baseline[scenario.name].steps == scenario.steps:
+            for problem in compare(measurement, baseline[scenario.name], args.threshold):
+                print(F"  REGRESSION {problem}")
+                regressions += 1
+    if args.update:
+        save_baseline(measurements, args.baseline)
+        print(F"baseline written to {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+import base64
+import struct
+
+from autonomous_intersection.continuous_canvas import HEADER, RECORD, ContinuousCanvas
+from autonomous_intersection.model import Intersection
+from autonomous_intersection.portrayal import portrayCell
+
+
+class Decoder:
+    """
+    Same as FrameDecoder in continuous_canvas.js
+    """
+
+    def __init__(self):
+        self.agents = {}
+        self.palette = []
+
+    def decode(self, data):
+        if data["keyframe"]:
+            self.agents.clear()
+            self.palette = []
+        self.palette.extend(data["palette"])
+        frame = base64.b64decode(data["frame"])
+        updates, removals = HEADER.unpack_from(frame)
+        offset = HEADER.size
+        for _ in range(updates):
+            agent_id, *values, color, flags, layer = RECORD.unpack_from(frame, offset)
+            self.agents[agent_id] = (*values, self.palette[color], flags, layer)
+            offset += RECORD.size
+        for agent_id in struct.unpack_from(F"<{removals}I", frame, offset):
+            del self.agents[agent_id]
+        return sorted(self.agents.values())
+
+
+def test_every_viewer_gets_the_background():
+    canvas = ContinuousCanvas(portrayCell, 1000, 1000, binary=True)
+    model = Intersection(spawn_rate=30, manager="Prediction", seed=1)
+    first = canvas.render(model, "first")
+    assert first["background"]
+    for _ in range(20):
+        model.step()
+        assert "background" not in canvas.render(model, "first")
+    second = canvas.render(model, "second")
+    assert len(second["background"]) == len(first["background"])
+    assert "background" not in canvas.render(model, "second")
+    canvas.forget("first")
+    assert canvas.render(model, "first")["background"]
+
+
+def test_viewers_decode_their_own_deltas():
+    canvas = ContinuousCanvas(portrayCell, 1000, 1000, binary=True)
+    model = Intersection(spawn_rate=30, manager="Prediction", seed=1)
+    decoders = {"first": Decoder(), "second": Decoder()}
+    for step in range(200):
+        model.step()
+        # the viewers ask for frames at different rates, as two browser tabs do
+        viewers = ["first"] if step % 3 else ["first", "second"]
+        for viewer in viewers:
+            agents = decoders[viewer].decode(canvas.render(model, viewer))
+            expected = Decoder().decode(ContinuousCanvas(portrayCell, binary=True).render(model))
+            assert agents == expected, (step, viewer)
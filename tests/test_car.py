@@ -0,0 +1,52 @@
+import math
+import random
+
+import pytest
+
+from autonomous_intersection.agents.car import Car
+from autonomous_intersection.agents.direction import Direction
+from autonomous_intersection.model import Intersection
+
+TOLERANCE = 1e-6
+
+
+def loop_displacement(direction, angle, steps):
+    x, y = 0.0, 0.0
+    for _ in range(steps):
+        direction = Car._get_new_direction(direction, angle)
+        x += direction[0]
+        y += direction[1]
+    return x, y
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_turn_displacement_matches_loop(seed):
+    generator = random.Random(seed)
+    for _ in range(50):
+        heading = generator.uniform(-math.pi, math.pi)
+        direction = (math.cos(heading), math.sin(heading))
+        angle = generator.choice([0.0, generator.uniform(-0.2, 0.2), generator.uniform(-1e-9, 1e-9)])
+        steps = generator.randint(1, 20)
+        expected = loop_displacement(direction, angle, steps)
+        actual = Car._get_turn_displacement(direction, angle, steps)
+        assert actual == pytest.approx(expected, abs=TOLERANCE)
+
+
+@pytest.mark.parametrize("entry", list(Direction))
+@pytest.mark.parametrize("target", list(Direction))
+@pytest.mark.parametrize("velocity", [20, 40, 60])
+def test_closed_form_turns_match_loop(entry, target, velocity):
+    if target == entry.reverse:
+        pytest.skip("cars do not turn back")
+    cars = []
+    for closed_form_turns in (False, True):
+        model = Intersection(manager="Prediction", velocity=velocity, closed_form_turns=closed_form_turns,
+                             headless=True)
+        cars.append(model.manager.build_car(1, entry, target, (30, 15)))
+    loop_state, closed_state = cars[0].state.copy(), cars[1].state.copy()
+    for step in range(400):
+        loop_state = cars[0].simulate(loop_state, 1)
+        closed_state = cars[1].simulate(closed_state, 1)
+        assert closed_state.x == pytest.approx(loop_state.x, abs=TOLERANCE), step
+        assert closed_state.y == pytest.approx(loop_state.y, abs=TOLERANCE), step
+        assert closed_state.rotation == pytest.approx(loop_state.rotation, abs=TOLERANCE), step
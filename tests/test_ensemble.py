@@ -0,0 +1,24 @@
+import pytest
+
+from autonomous_intersection.ensemble import Ensemble
+from autonomous_intersection.model import Intersection, Manager
+
+SEEDS = (1, 2, 3)
+STEPS = 200
+
+
+@pytest.mark.parametrize("exact_collisions", [False, True])
+@pytest.mark.parametrize("manager", [manager.name for manager in Manager])
+def test_replicas_match_single_models(manager, exact_collisions):
+    ensemble = Ensemble(SEEDS, spawn_rate=30, manager=manager, exact_collisions=exact_collisions, headless=True)
+    series = ensemble.run(STEPS)
+    for seed, rates, replica in zip(SEEDS, series, ensemble.replicas):
+        model = Intersection(spawn_rate=30, manager=manager, seed=seed, exact_collisions=exact_collisions,
+                             fleet=True, headless=True)
+        expected = []
+        for _ in range(STEPS):
+            model.step()
+            expected.append(model.get_agent_rate())
+        assert rates.tolist() == expected
+        assert [(car.unique_id, car.x, car.y) for car in replica.manager.cars.values()] == \
+               [(car.unique_id, car.x, car.y) for car in model.manager.cars.values()]
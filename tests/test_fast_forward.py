@@ -0,0 +1,32 @@
+import pytest
+
+from autonomous_intersection.model import Intersection, Manager
+
+STEPS = 800
+
+
+def create(manager, spawn_rate, fleet, fast_forward):
+    return Intersection(spawn_rate=spawn_rate, manager=manager, seed=3, fleet=fleet, fast_forward=fast_forward,
+                        track_cars=True, headless=True)
+
+
+def state(model):
+    cars = tuple((car.unique_id, car.x, car.y, car.rotation, car.state.velocity, car.lost_time, car.stopped_steps)
+                 for car in model.manager.cars.values())
+    return model.schedule.steps, model.manager.steps, model.data_collector.steps, model.get_agent_rate(), cars
+
+
+@pytest.mark.parametrize("fleet", [False, True])
+@pytest.mark.parametrize("spawn_rate", [0.5, 1])
+@pytest.mark.parametrize("manager", [manager.name for manager in Manager])
+def test_jumps_match_regular_steps(manager, spawn_rate, fleet):
+    regular = create(manager, spawn_rate, fleet, False)
+    model = create(manager, spawn_rate, fleet, True)
+    while model.schedule.steps < STEPS:
+        steps = model.advance(STEPS - model.schedule.steps)
+        for _ in range(steps):
+            regular.step()
+        assert state(model) == state(regular), model.schedule.steps
+        assert model.random.getstate() == regular.random.getstate()
+    assert list(model.data_collector.recent) == list(regular.data_collector.recent)
+    assert model.coasted_steps > 0
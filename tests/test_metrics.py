@@ -0,0 +1,27 @@
+from autonomous_intersection.metrics import read_metrics
+from autonomous_intersection.model import Intersection
+
+
+def test_close_writes_cars_still_driving(tmp_path):
+    model = Intersection(spawn_rate=30, manager="Prediction", seed=1, headless=True, metrics_dir=str(tmp_path),
+                         metrics_chunk_size=16)
+    for _ in range(300):
+        model.step()
+    driving = {car.unique_id: car.lost_time for car in model.manager.cars.values()}
+    model.close()
+    model.close()
+    cars = read_metrics(str(tmp_path), "cars")
+    assert len(set(cars["id"].tolist())) == len(cars["id"]) == model.agent_id
+    still_driving = cars["exit_step"] == -1
+    assert dict(zip(cars["id"][still_driving].tolist(), cars["delay"][still_driving].tolist())) == driving
+    assert cars["delay"].max() > 0
+
+
+def test_cars_are_tracked_only_when_asked():
+    models = [Intersection(spawn_rate=30, manager="Prediction", seed=1, headless=True, track_cars=track)
+              for track in (False, True)]
+    for model in models:
+        for _ in range(100):
+            model.step()
+    untracked, tracked = ([car.lost_time for car in model.manager.cars.values()] for model in models)
+    assert not any(untracked) and any(tracked)
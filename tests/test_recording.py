@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from autonomous_intersection.model import Intersection
+from autonomous_intersection.recording import Replay, ReplayModel
+
+
+def create(directory, chunk_size):
+    return Intersection(spawn_rate=30, manager="Prediction", seed=1, headless=True, record_dir=str(directory),
+                        record_chunk_size=chunk_size)
+
+
+def run(model, steps):
+    for _ in range(steps):
+        model.step()
+
+
+@pytest.mark.parametrize("chunk_size", [16, 256])
+def test_recording_follows_restore(tmp_path, chunk_size):
+    straight = create(tmp_path / "straight", chunk_size)
+    run(straight, 70)
+    straight.close()
+
+    model = create(tmp_path / "restored", chunk_size)
+    run(model, 50)
+    snapshot = model.snapshot()
+    # the abandoned branch spawns other cars under the same ids
+    model.random.seed(2)
+    run(model, 30)
+    model.restore(snapshot)
+    run(model, 20)
+    model.close()
+
+    expected, actual = Replay(str(tmp_path / "straight")), Replay(str(tmp_path / "restored"))
+    assert actual.steps == expected.steps == 70
+    assert len(actual.index) == len(expected.index)
+    for step in range(1, 71):
+        assert np.array_equal(actual.frame(step), expected.frame(step)), step
+        assert actual.markers(step) == expected.markers(step), step
+    assert {car_id: car.tolist() for car_id, car in actual.cars.items()} == \
+           {car_id: car.tolist() for car_id, car in expected.cars.items()}
+
+
+def test_replay_model_plays_every_step(tmp_path):
+    model = create(tmp_path, 16)
+    run(model, 40)
+    model.close()
+    replay = ReplayModel(str(tmp_path), start=30)
+    steps = [replay.current]
+    while replay.running:
+        replay.step()
+        steps.append(replay.current)
+    assert steps[:-1] == list(range(30, 41))
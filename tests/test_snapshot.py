@@ -0,0 +1,40 @@
+import pytest
+
+from autonomous_intersection.model import Intersection, Manager
+
+STEPS = 300
+INTERVAL = 20
+CONTINUATION = 20
+
+
+def create(manager, seed, fleet):
+    return Intersection(spawn_rate=30, manager=manager, velocity=40, acceleration=30, seed=seed, fleet=fleet,
+                        headless=True)
+
+
+def state(model):
+    cars = tuple((car.unique_id, round(car.x, 6), round(car.y, 6), round(car.rotation, 6), car.state.velocity)
+                 for car in model.manager.cars.values())
+    return model.schedule.steps, model.get_agent_rate(), cars
+
+
+@pytest.mark.parametrize("fleet", [False, True])
+@pytest.mark.parametrize("manager", [manager.name for manager in Manager])
+def test_restored_run_continues_like_original(manager, fleet):
+    model = create(manager, 1, fleet)
+    snapshots = {}
+    expected = {}
+    for step in range(STEPS + CONTINUATION):
+        if step % INTERVAL == 0 and step <= STEPS:
+            snapshots[step] = model.snapshot()
+        model.step()
+        expected[step + 1] = state(model)
+    # restore into a model that has already run with another seed, so nothing carries over by accident
+    other = create(manager, 2, fleet)
+    for _ in range(60):
+        other.step()
+    for step, snapshot in snapshots.items():
+        other.restore(snapshot)
+        for offset in range(1, CONTINUATION + 1):
+            other.step()
+            assert state(other) == expected[step + offset], (step, offset)